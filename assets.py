@@ -0,0 +1,172 @@
+"""Background asset loading.
+
+Every asset is a named job in two halves: ``decode`` runs on a worker thread
+(file reads, image decoding, sheet slicing) and ``finish`` runs on the main
+thread from ``pump`` (convert/convert_alpha, scaling), a few per frame, so
+the window keeps drawing while the rest streams in.
+
+``AssetIndex`` finds files by name without caring about case (the assets
+were named on Windows) and lists numbered frame series in natural order;
+``decode_all`` decodes such a series on a thread pool.
+"""
+import itertools
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
+
+_DIGITS = re.compile(r"(\d+)")
+
+def natural_key(name):
+    """Sort key that puts "Image2.png" before "Image10.png", ignoring case."""
+    return [int(part) if part.isdigit() else part.lower() for part in _DIGITS.split(name)]
+
+class AssetIndex:
+    """File names per directory, each directory listed once on first use.
+
+    ``find`` matches the file name case-insensitively, so ``image0.png``
+    finds ``Image0.png`` on Linux too, with no stat per candidate name.
+    """
+    def __init__(self):
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+    def _listing(self, directory):
+        """{lowercase name: name on disk} for ``directory`` ({} if it is missing)."""
+        with self._lock:
+            listing = self._dirs.get(directory)
+            if listing is None:
+                listing = {}
+                try:
+                    with os.scandir(directory) as it:
+                        for entry in it:
+                            if entry.is_file():
+                                listing.setdefault(entry.name.lower(), entry.name)
+                except OSError:
+                    pass
+                self._dirs[directory] = listing
+            return listing
+
+    def find(self, path):
+        """``path`` as it is spelled on disk, or None if no file matches."""
+        directory, name = os.path.split(path)
+        real = self._listing(directory).get(name.lower())
+        return None if real is None else os.path.join(directory, real)
+
+    def series(self, directory, suffix=""):
+        """Paths of the files in ``directory`` ending in ``suffix`` (any case), in natural order."""
+        suffix = suffix.lower()
+        names = [name for low, name in self._listing(directory).items() if low.endswith(suffix)]
+        return [os.path.join(directory, name) for name in sorted(names, key=natural_key)]
+
+    def rescan(self, directory=None):
+        """Forget one directory's listing (or all of them) after files changed."""
+        with self._lock:
+            if directory is None:
+                self._dirs.clear()
+            else:
+                self._dirs.pop(directory, None)
+
+def decode_all(paths, decode, workers=DECODE_WORKERS):
+    """``decode(path)`` for every path on a pool of ``workers`` threads, in
+    order; paths that fail are printed and left out."""
+    def attempt(path):
+        try:
+            return decode(path)
+        except Exception as e:
+            print("Failed to decode", path, e)
+            return None
+    if workers <= 1 or len(paths) <= 1:
+        results = [attempt(p) for p in paths]
+    else:
+        with ThreadPoolExecutor(workers, thread_name_prefix="asset-decode") as pool:
+            results = list(pool.map(attempt, paths))
+    return [r for r in results if r is not None]
+
+class AssetLoader:
+    def __init__(self, workers=1):
+        self._jobs = queue.PriorityQueue()
+        self._decoded = queue.Queue()
+        self._assets = {}
+        self._pending = {}   # name -> (finish, on_ready), requested but not finished yet
+        self._claimed = set()
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"asset-loader-{i}", daemon=True).start()
+
+    def request(self, name, decode, finish=None, priority=10, on_ready=None):
+        """Queue ``name`` unless it is already loaded; lower priority runs first.
+
+        ``on_ready(value)`` is called on the main thread once it is stored.
+        Requesting a queued name again with a lower number moves it forward.
+        """
+        if name in self._assets:
+            return
+        self._pending.setdefault(name, (finish, on_ready))
+        self._jobs.put((priority, next(self._seq), name, decode))
+
+    def _work(self):
+        while True:
+            _, _, name, decode = self._jobs.get()
+            with self._lock:
+                if name in self._claimed:
+                    continue
+                self._claimed.add(name)
+            try:
+                self._decoded.put((name, decode(), None))
+            except Exception as e:
+                self._decoded.put((name, None, e))
+
+    def pump(self, budget_ms=4.0):
+        """Run finish steps for decoded assets until ``budget_ms`` is spent."""
+        deadline = perf_counter() + budget_ms / 1000.0
+        while perf_counter() < deadline:
+            try:
+                name, raw, err = self._decoded.get_nowait()
+            except queue.Empty:
+                return
+            if name not in self._pending:
+                continue  # a leftover duplicate job for an asset discarded since
+            finish, on_ready = self._pending.pop(name)
+            value = None
+            if err is not None:
+                print("Failed to load", name, err)
+            else:
+                try:
+                    value = finish(raw) if finish else raw
+                except Exception as e:
+                    print("Failed to prepare", name, e)
+            self._assets[name] = value
+            if on_ready is not None:
+                on_ready(value)
+
+    def ready(self, name):
+        return name in self._assets
+
+    def discard(self, name):
+        """Forget a loaded asset, so it can be freed and requested again."""
+        self._assets.pop(name, None)
+        with self._lock:
+            self._claimed.discard(name)
+
+    def get(self, name, default=None):
+        value = self._assets.get(name)
+        return default if value is None else value
+
+    def progress(self, names):
+        """Fraction of ``names`` that are loaded (1.0 for an empty list)."""
+        if not names:
+            return 1.0
+        return sum(1 for n in names if n in self._assets) / len(names)
+
+    def wait(self, names, budget_ms=50.0):
+        """Block until every name is loaded; for headless tools, not the game loop."""
+        while not all(n in self._assets for n in names):
+            self.pump(budget_ms)
+            if not all(n in self._assets for n in names):
+                sleep(0.001)
@@ -0,0 +1,119 @@
+"""Sound effects: reserved mixer channels per group and cached synthesized tones.
+
+``VoiceManager`` gives each group of sounds (hits, shots, ...) its own
+reserved channels, so a burst of one kind can't take every channel. A
+sound started again within its group's ``min_interval_ms`` is dropped, and
+when every channel of a group is busy the voice that started first is cut
+off for the new one.
+
+``tone`` synthesizes the fallback beeps once and keeps their raw PCM under
+CACHE_DIR/sounds, so later launches load each with a single file read.
+"""
+import os
+from time import perf_counter
+
+import numpy as np
+import pygame
+
+from sprites import CACHE_DIR
+
+SOUND_CACHE_DIR = os.path.join(CACHE_DIR, "sounds")
+TONE_VERSION = 1  # bump when the synthesis below changes
+TONE_SAMPLE_RATE = 44100
+
+class VoiceManager:
+    """Plays sounds on reserved channel groups.
+
+    ``groups`` maps a group name to (channel count, min_interval_ms).
+    Channels 0..total-1 are reserved, so plain ``Sound.play()`` calls
+    elsewhere never land on them.
+    """
+    def __init__(self, groups, clock=perf_counter):
+        self.clock = clock
+        self.channels = {}
+        self.min_interval = {}
+        self.stats = {"played": 0, "limited": 0, "stolen": 0}
+        self._started = {}   # channel index -> start time of its voice
+        self._last = {}      # (group, sound) -> last start time
+        if not pygame.mixer.get_init():
+            return
+        total = sum(count for count, _ in groups.values())
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), total + 8))
+        pygame.mixer.set_reserved(total)
+        first = 0
+        for name, (count, interval_ms) in groups.items():
+            self.channels[name] = list(range(first, first + count))
+            self.min_interval[name] = interval_ms / 1000.0
+            first += count
+
+    def play(self, group, sound, loops=0):
+        """Start ``sound`` in ``group``; returns its Channel, or None if rate
+        limited (or the mixer or group is missing)."""
+        indices = self.channels.get(group)
+        if not indices or sound is None:
+            return None
+        now = self.clock()
+        key = (group, id(sound))
+        last = self._last.get(key)
+        if last is not None and now - last < self.min_interval[group]:
+            self.stats["limited"] += 1
+            return None
+        started = self._started
+        free = [i for i in indices if not pygame.mixer.Channel(i).get_busy()]
+        if free:
+            index = free[0]
+        else:
+            # voice stealing: the oldest voice in the group makes room
+            index = min(indices, key=lambda i: started.get(i, 0.0))
+            self.stats["stolen"] += 1
+        channel = pygame.mixer.Channel(index)
+        try:
+            channel.play(sound, loops=loops)
+        except Exception:
+            return None
+        started[index] = now
+        self._last[key] = now
+        self.stats["played"] += 1
+        return channel
+
+    def stop(self, group=None):
+        """Silence one group, or every group."""
+        for name, indices in self.channels.items():
+            if group is None or name == group:
+                for i in indices:
+                    pygame.mixer.Channel(i).stop()
+
+def synth_tone(freq=440, duration=0.1, vol=0.5):
+    """Stereo int16 samples of a decaying sine at TONE_SAMPLE_RATE."""
+    t = np.linspace(0, duration, int(TONE_SAMPLE_RATE * duration), endpoint=False)
+    wave = vol * np.sin(2 * np.pi * freq * t)
+    wave *= np.linspace(1.0, 0.1, wave.size)
+    stereo = np.column_stack((wave, wave))
+    return np.ascontiguousarray((stereo * 32767).astype(np.int16))
+
+def tone_path(freq, duration, vol):
+    rate, size, channels = pygame.mixer.get_init()
+    name = f"tone-v{TONE_VERSION}-{freq}-{duration}-{vol}-{rate}-{size}-{channels}.pcm"
+    return os.path.join(SOUND_CACHE_DIR, name)
+
+def tone(freq=440, duration=0.1, vol=0.5):
+    """A synth_tone as a Sound, from the PCM cache when it has been built
+    before; None without a mixer."""
+    if not pygame.mixer.get_init():
+        return None
+    path = tone_path(freq, duration, vol)
+    try:
+        with open(path, "rb") as f:
+            return pygame.mixer.Sound(buffer=f.read())
+    except (OSError, pygame.error):
+        pass
+    sound = pygame.sndarray.make_sound(synth_tone(freq, duration, vol))
+    try:
+        os.makedirs(SOUND_CACHE_DIR, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(sound.get_raw())
+        os.replace(tmp, path)
+    except OSError as e:
+        print("Could not cache sound", path, e)
+    return sound
@@ -0,0 +1,212 @@
+"""Headless benchmarks for the game's hot paths.
+
+    python bench.py                  # JSON results on stdout
+    python bench.py --out bench.json --repeat 50
+    python bench.py --only bullets   # run the groups whose name contains "bullets"
+
+Runs under the SDL dummy video/audio drivers, so it works on CI boxes with no
+display. Every result is a timing summary in milliseconds; compare two JSON
+files from different versions to catch regressions.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+from time import perf_counter, strftime
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+
+def summarize(samples_ms):
+    a = np.asarray(samples_ms, np.float64)
+    return {"n": int(a.size), "mean_ms": round(float(a.mean()), 4), "min_ms": round(float(a.min()), 4),
+            "p50_ms": round(float(np.percentile(a, 50)), 4), "p99_ms": round(float(np.percentile(a, 99)), 4)}
+
+def timed(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        fn()
+        samples.append((perf_counter() - t0) * 1000.0)
+    return summarize(samples)
+
+# ================== Groups ==================
+def bench_sheets(game, repeat):
+    import sprites
+    from assets import DECODE_WORKERS, decode_all
+    paths = game.asset_index.series(game.FIREBALL_DIR, ".png")
+    out = {}
+    for name, (path, cfg) in game.SHEETS.items():
+        out[f"load_sheet_by_cfg/{name}"] = timed(lambda: sprites.load_sheet_by_cfg(path, cfg), repeat)
+        out[f"load_sheet_cached/{name}"] = timed(lambda: sprites.load_sheet_cached(path, cfg), repeat)
+    out["decode_fireballs/serial"] = timed(lambda: decode_all(paths, pygame.image.load, workers=1), repeat)
+    out[f"decode_fireballs/{DECODE_WORKERS}workers"] = timed(game.decode_fireballs, repeat)
+    return out
+
+def bench_maps(game, repeat):
+    import maps
+    out = {}
+    for name, path in game.background_files.items():
+        if not os.path.isfile(path):
+            continue
+        base = os.path.basename(path)
+        size = game.backgrounds.size
+        out[f"map_background/{base}"] = timed(
+            lambda: pygame.transform.scale(maps.decode_at_most(path, size).convert(), size), repeat)
+        out[f"map_thumbnail/{base}"] = timed(lambda: maps.make_thumbnail(path, game.backgrounds.thumb_size), repeat)
+    return out
+
+def bench_rescale(game, repeat, scales=(0.5, 1.0, 1.5, 2.0)):
+    import sprites
+    out = {}
+    for name, (path, cfg) in game.SHEETS.items():
+        orig = sprites.load_sheet_cached(path, cfg)
+        for s in scales:
+            out[f"rescale_animations/{name}/x{s}"] = timed(lambda: sprites.rescale_animations(orig, s), repeat)
+    fire = [f.convert_alpha() for f in game.decode_fireballs()]
+    for s in scales:
+        out[f"rescale_fireballs/{len(fire)}frames/x{s}"] = timed(lambda: sprites.rescale_fireballs(fire, s), repeat)
+    return out
+
+def bench_bullets(game, repeat, counts=(10, 100, 1000), frames=60):
+    import simulation as sim
+    out = {}
+    sizes = [(64, 48)] * 8
+    for n in counts:
+        state = sim.new_match(bullet_sizes=sizes)
+        for f in state.fighters:
+            f.health = 10**9
+        rng = np.random.default_rng(n)
+        # keep ~n bullets alive: respawn what collided or left the screen
+        def run():
+            for _ in range(frames):
+                pool = state.bullets
+                for _ in range(n - pool.n):
+                    pool.spawn(rng.uniform(0, sim.SCREEN_WIDTH), rng.uniform(300, sim.GROUND_Y),
+                               bool(rng.integers(2)), int(rng.integers(2)))
+                sim.step(state, (0, 0))
+        r = timed(run, repeat)
+        per_frame = {k: (round(v / frames, 4) if k.endswith("_ms") else v) for k, v in r.items()}
+        out[f"bullet_step/{n}"] = per_frame
+    return out
+
+def bench_env(game, repeat, counts=(1, 16, 64), steps=60):
+    from env import VecEnv
+    out = {}
+    for n in counts:
+        env = VecEnv(n)
+        env.reset()
+        rng = np.random.default_rng(n)
+        actions = rng.integers(0, 32, (steps, n, env.fighters), dtype=np.uint8)
+        def run():
+            for a in actions:
+                env.step(a)
+        r = timed(run, repeat)
+        out[f"env_step/{n}"] = {k: (round(v / steps, 4) if k.endswith("_ms") else v) for k, v in r.items()}
+    return out
+
+def bench_render(game, repeat, frames=30):
+    # Everything a match needs, loaded synchronously
+    game.selected_map = 0
+    game.request_map(0)
+    game.loader.wait(game.match_assets())
+    game.loader.wait(["map_select_bg"])
+    pool = game.match.bullets
+    for i in range(20):
+        pool.spawn(100 + 30 * i, 450, i % 2 == 0, i % 2)
+
+    def frame(draw):
+        def run():
+            for _ in range(frames):
+                draw()
+                game.display.flip()
+        return run
+
+    def playing():
+        game.draw_match_scene()
+
+    def paused():
+        game.draw_match_scene()
+        game.draw_pause_menu()
+
+    def game_over():
+        game.winner = "Naruto"
+        game.draw_match_scene()
+        game.draw_game_over()
+
+    states = {
+        "start_menu": game.draw_start_menu,
+        "controls": game.draw_controls_screen,
+        "map_selection": game.draw_map_selection,
+        "loading": lambda: game.draw_loading_screen(0.5),
+        "playing": playing,
+        "paused": paused,
+        "game_over": game_over,
+    }
+    out = {}
+    for name, draw in states.items():
+        r = timed(frame(draw), repeat)
+        out[f"render_frame/{name}"] = {k: (round(v / frames, 4) if k.endswith("_ms") else v) for k, v in r.items()}
+    return out
+
+def bench_present(game, repeat, frames=30, windows=((1280, 720), (1920, 1080), (3840, 2160))):
+    # Sets new display modes, so it runs last
+    from render import SCALE_FILTERS, ScaledDisplay
+    game.draw_start_menu()
+    picture = game.screen.copy()
+    out = {}
+    for filt in SCALE_FILTERS:
+        for w, h in windows:
+            d = ScaledDisplay(picture.get_size(), (w, h), filt)
+            d.surface.blit(picture, (0, 0))
+            r = timed(lambda: [d.flip() for _ in range(frames)], repeat)
+            out[f"present/{filt}/{w}x{h}"] = {k: (round(v / frames, 4) if k.endswith("_ms") else v) for k, v in r.items()}
+    return out
+
+GROUPS = {"sheets": bench_sheets, "maps": bench_maps, "rescale": bench_rescale, "bullets": bench_bullets, "env": bench_env,
+          "render": bench_render, "present": bench_present}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--out", help="write JSON here instead of stdout")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--only", default="", help="substring filter on group names")
+    args = ap.parse_args(argv)
+
+    # The game prints while loading; keep stdout clean for the JSON.
+    with contextlib.redirect_stdout(sys.stderr):
+        import naruto_vs_sasuke as game
+        results = {}
+        for name, fn in GROUPS.items():
+            if args.only in name:
+                results.update(fn(game, args.repeat))
+
+    report = {
+        "meta": {
+            "timestamp": strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "video_driver": pygame.display.get_driver(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    blob = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(blob + "\n")
+    else:
+        print(blob)
+
+if __name__ == "__main__":
+    main()
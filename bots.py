@@ -0,0 +1,257 @@
+"""Scripted bots: each turns a MatchState into one fighter's IN_* bitmask.
+
+A bot is built as ``BOTS[name](index, rng)`` for fighter ``index`` and
+asked ``act(state)`` once per step; it sees the whole state, like a player
+watching the screen. Most are deliberately simple, for tournaments and sparring;
+``CpuBot`` is the game's CPU opponent and plans ahead within a time budget.
+"""
+from time import perf_counter
+
+from simulation import (
+    ATTACK_COOLDOWN_FRAMES, BULLET_DAMAGE, IN_ATTACK, IN_JUMP, IN_LEFT, IN_RIGHT, IN_SHOOT, SHOOT_COOLDOWN_FRAMES,
+    Fighter, MatchState, random_inputs, step,
+)
+
+def nearest_enemy(state, i):
+    """Index of the closest standing fighter on another side, or None."""
+    me = state.fighters[i]
+    teams = state.team_idx
+    best, best_dx = None, None
+    for j, f in enumerate(state.fighters):
+        if teams[j] == teams[i] or f.health <= 0:
+            continue
+        dx = abs(f.midbottom_x - me.midbottom_x)
+        if best is None or dx < best_dx:
+            best, best_dx = j, dx
+    return best
+
+def incoming_bullet(state, i, within=140):
+    """True if an enemy bullet is flying at fighter ``i`` and less than ``within`` px away."""
+    pool = state.bullets
+    if not pool.n:
+        return False
+    me = state.fighters[i]
+    teams = state.team_idx
+    for x, vx, owner in zip(pool.x[:pool.n].tolist(), pool.vx[:pool.n].tolist(), pool.owner[:pool.n].tolist()):
+        dx = me.midbottom_x - x
+        if teams[owner] != teams[i] and dx * vx > 0 and abs(dx) < within:
+            return True
+    return False
+
+def toward(me, other):
+    return IN_RIGHT if other.midbottom_x > me.midbottom_x else IN_LEFT
+
+class IdleBot:
+    """Stands still: a punching bag."""
+    def __init__(self, index, rng):
+        self.index = index
+
+    def act(self, state):
+        return 0
+
+class RandomBot:
+    """Random buttons, each combination held for a few frames."""
+    def __init__(self, index, rng, hold=(4, 30)):
+        self.index = index
+        self.rng = rng
+        self.hold = hold
+        self.buttons = 0
+        self.left = 0
+
+    def act(self, state):
+        if self.left <= 0:
+            self.buttons = random_inputs(self.rng, 1)[0]
+            self.left = self.rng.randint(*self.hold)
+        self.left -= 1
+        return self.buttons
+
+class RushBot:
+    """Walks up to the nearest enemy and melees; jumps fireballs."""
+    def __init__(self, index, rng):
+        self.index = index
+
+    def act(self, state):
+        j = nearest_enemy(state, self.index)
+        if j is None:
+            return 0
+        me, enemy = state.fighters[self.index], state.fighters[j]
+        buttons = IN_JUMP if incoming_bullet(state, self.index) else 0
+        reach = (me.rw + enemy.rw) // 2
+        if abs(enemy.midbottom_x - me.midbottom_x) > reach:
+            return buttons | toward(me, enemy)
+        facing_enemy = (enemy.midbottom_x > me.midbottom_x) == me.facing_right
+        return buttons | (IN_ATTACK if facing_enemy else toward(me, enemy))
+
+class ZonerBot:
+    """Keeps its distance and shoots; melees anyone who gets too close."""
+    def __init__(self, index, rng, near=220, far=420):
+        self.index = index
+        self.near = near
+        self.far = far
+
+    def act(self, state):
+        j = nearest_enemy(state, self.index)
+        if j is None:
+            return 0
+        me, enemy = state.fighters[self.index], state.fighters[j]
+        dist = abs(enemy.midbottom_x - me.midbottom_x)
+        buttons = IN_JUMP if incoming_bullet(state, self.index) else 0
+        if dist < (me.rw + enemy.rw) // 2:
+            return buttons | toward(me, enemy) | IN_ATTACK
+        if me.shoot_cooldown <= 0:
+            # one step towards turns us round before the shot leaves
+            return buttons | toward(me, enemy) | IN_SHOOT
+        if dist < self.near:
+            return buttons | (IN_LEFT if toward(me, enemy) == IN_RIGHT else IN_RIGHT)
+        if dist > self.far:
+            return buttons | toward(me, enemy)
+        return buttons
+
+# CPU difficulty: (think time per frame in microseconds, lookahead frames)
+CPU_LEVELS = {"easy": (300, 6), "normal": (1200, 12), "hard": (4000, 24)}
+CPU_MAX_BUDGET_US = 8000  # half a 60 Hz frame, whatever the level asks for
+
+class CpuBot:
+    """Plays like a keyboard player by thinking ahead.
+
+    Each decision tries every candidate move (walk, jump, melee, shoot and
+    combinations, relative to the nearest enemy) on a private copy of the
+    match: the move is held for ``depth`` frames while everyone else stands
+    still, then scored on damage dealt and taken, fireballs still flying at
+    either side, and spacing: melee range when the melee is ready, out of
+    reach while it recovers. Moves that can't fire within the lookahead
+    because of ATTACK/SHOOT_COOLDOWN_FRAMES are not tried at all.
+
+    The search is time-sliced: ``act`` advances it by at most ``budget_us``
+    microseconds, never starting a simulated frame it expects to overrun,
+    and holds the last decision until the next one is finished. A smaller
+    budget or depth is a slower, shorter-sighted opponent. With
+    ``budget_us=None`` each call runs exactly ``steps`` simulated frames, so
+    headless matches don't depend on machine speed.
+    """
+    def __init__(self, index, rng, budget_us=None, depth=12, steps=48):
+        self.index = index
+        self.budget_us = None if budget_us is None else min(budget_us, CPU_MAX_BUDGET_US)
+        self.depth = depth
+        self.steps = steps
+        self.buttons = 0
+        self.step_s = 50e-6   # running estimate of one simulated frame
+        self.decisions = 0
+        self._scratch = None
+        self._plan = None
+
+    @classmethod
+    def level(cls, index, rng, name="normal", share=1):
+        """A CpuBot at difficulty ``name`` (see CPU_LEVELS), given 1/``share`` of its budget."""
+        budget_us, depth = CPU_LEVELS[name]
+        return cls(index, rng, budget_us // max(1, share), depth)
+
+    def act(self, state):
+        if state.game_over or state.fighters[self.index].health <= 0:
+            return 0
+        if self.budget_us is None:
+            for _ in range(self.steps):
+                self._think(state)
+            return self.buttons
+        t = perf_counter()
+        deadline = t + self.budget_us / 1e6
+        while t + self.step_s < deadline:
+            self._think(state)
+            now = perf_counter()
+            self.step_s += (now - t - self.step_s) * 0.1
+            t = now
+        return self.buttons
+
+    def _think(self, state):
+        """One simulated frame of the search, starting a new plan when needed."""
+        plan = self._plan
+        if plan is None:
+            plan = self._plan = self._new_plan(state)
+            if plan is None:
+                self.buttons = 0
+                return
+        scratch = self._scratch
+        if plan["frames"] == 0:
+            scratch.restore(plan["root"])
+            plan["dealt"] = plan["taken"] = 0
+        step(scratch, plan["inputs"])
+        me = plan["name"]
+        for ev in scratch.events:
+            if ev[0] == "hit":
+                if ev[1] == me:
+                    plan["dealt"] += ev[3]
+                elif ev[2] == me:
+                    plan["taken"] += ev[3]
+        plan["frames"] += 1
+        if plan["frames"] < self.depth and not scratch.game_over:
+            return
+        score = self._score(scratch, plan)
+        if plan["best"] is None or score > plan["best"][0]:
+            plan["best"] = (score, plan["moves"][plan["move"]])
+        plan["frames"] = 0
+        plan["move"] += 1
+        if plan["move"] < len(plan["moves"]):
+            plan["inputs"][self.index] = plan["moves"][plan["move"]]
+        else:
+            self.buttons = plan["best"][1]
+            self.decisions += 1
+            self._plan = None
+
+    def _new_plan(self, state):
+        i = self.index
+        j = nearest_enemy(state, i)
+        if j is None:
+            return None
+        scratch = self._scratch
+        if scratch is None or len(scratch.fighters) != len(state.fighters):
+            scratch = self._scratch = MatchState([Fighter(0, state.ground_y, f.name) for f in state.fighters])
+        scratch.team_idx = state.team_idx
+        scratch.bullet_sizes = state.bullet_sizes
+        scratch.bullet_masks = state.bullet_masks
+        scratch.ground_y, scratch.width = state.ground_y, state.width
+
+        me, enemy = state.fighters[i], state.fighters[j]
+        to = toward(me, enemy)
+        away = IN_LEFT if to == IN_RIGHT else IN_RIGHT
+        moves = [0, to, away, IN_JUMP, to | IN_JUMP, away | IN_JUMP]
+        if me.attack_cooldown < self.depth:
+            moves += [IN_ATTACK, to | IN_ATTACK]
+        if me.shoot_cooldown < self.depth:
+            moves += [to | IN_SHOOT, IN_JUMP | IN_SHOOT]
+        # the current move goes first, so it wins ties and the bot doesn't dither
+        if self.buttons in moves:
+            moves.remove(self.buttons)
+            moves.insert(0, self.buttons)
+        inputs = [0] * len(state.fighters)
+        inputs[i] = moves[0]
+        return {"root": state.snapshot(), "target": j, "name": me.name, "moves": moves, "move": 0,
+                "inputs": inputs, "frames": 0, "dealt": 0, "taken": 0, "best": None}
+
+    def _score(self, scratch, plan):
+        i, j = self.index, plan["target"]
+        me, enemy = scratch.fighters[i], scratch.fighters[j]
+        score = plan["dealt"] - 1.5 * plan["taken"]
+        if scratch.game_over:
+            return score + (1000 if scratch.winner == scratch.side(i) else -1000)
+        # fireballs in flight land after the lookahead: count them at half weight
+        pool, teams = scratch.bullets, scratch.team_idx
+        for x, vx, owner in zip(pool.x[:pool.n].tolist(), pool.vx[:pool.n].tolist(), pool.owner[:pool.n].tolist()):
+            if teams[owner] == teams[i]:
+                if (enemy.midbottom_x - x) * vx > 0:
+                    score += 0.5 * BULLET_DAMAGE
+            elif (me.midbottom_x - x) * vx > 0 and abs(me.midbottom_x - x) < 300:
+                score -= (0.25 if me.is_jumping else 0.75) * BULLET_DAMAGE
+        dist = abs(enemy.midbottom_x - me.midbottom_x)
+        reach = (me.rw + enemy.rw) // 2
+        if me.attack_cooldown < ATTACK_COOLDOWN_FRAMES // 3:
+            # how far the enemy is from the middle of where our melee would land
+            ax, _, aw, _ = me.attack_box()
+            score -= 0.02 * abs(ax + aw / 2 - enemy.midbottom_x)
+        else:
+            score -= 0.02 * max(0, 2 * reach - dist)
+        if me.shoot_cooldown == 0 and enemy.shoot_cooldown > SHOOT_COOLDOWN_FRAMES // 2:
+            # a shot is ready and theirs isn't: some distance to use it from is worth a little
+            score -= 0.005 * max(0, 3 * reach - dist)
+        return score
+
+BOTS = {"idle": IdleBot, "random": RandomBot, "rush": RushBot, "zoner": ZonerBot, "cpu": CpuBot}
@@ -0,0 +1,140 @@
+"""Map backgrounds within a memory budget, and thumbnails for the menus.
+
+A full-screen background is the largest thing the game keeps in memory,
+and the source JPEGs are several times the screen's size. ``MapManager``
+decodes a background only when it is asked for, on the asset loader, and
+JPEGs are decoded straight at a reduced size (Pillow's draft mode) so the
+full-size image never exists. Backgrounds not used lately are dropped
+once they pass the budget and decoded again if they come back.
+
+Thumbnails are made once per source file and kept as small PNGs under
+CACHE_DIR/maps, so the map selection screen never decodes a whole map.
+"""
+import os
+from collections import OrderedDict
+
+import pygame
+from PIL import Image
+
+from sprites import CACHE_DIR
+
+THUMB_DIR = os.path.join(CACHE_DIR, "maps")
+THUMB_VERSION = 1  # bump when the thumbnail recipe below changes
+
+def decode_at_most(path, size):
+    """``path`` as an RGB Surface (not converted), at least ``size`` but
+    decoded no larger than needed when the format allows it (JPEG)."""
+    with Image.open(path) as im:
+        im.draft("RGB", size)
+        im = im.convert("RGB")
+        return pygame.image.frombuffer(im.tobytes(), im.size, "RGB")
+
+def thumb_path(path, size):
+    st = os.stat(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(THUMB_DIR, f"{stem}-v{THUMB_VERSION}-{size[0]}x{size[1]}-{st.st_size}-{st.st_mtime_ns}.png")
+
+def make_thumbnail(path, size):
+    """A ``size`` thumbnail of ``path``, stretched like the background is, from
+    the thumbnail cache when it has been made before."""
+    cached = thumb_path(path, size)
+    try:
+        return pygame.image.load(cached)
+    except (OSError, pygame.error):
+        pass
+    with Image.open(path) as im:
+        im.draft("RGB", size)
+        im = im.convert("RGB").resize(size, Image.LANCZOS)
+    try:
+        os.makedirs(THUMB_DIR, exist_ok=True)
+        tmp = cached + ".tmp"
+        im.save(tmp, "PNG")
+        os.replace(tmp, cached)
+    except OSError as e:
+        print("Could not cache thumbnail", cached, e)
+    return pygame.image.frombuffer(im.tobytes(), im.size, "RGB")
+
+def surface_bytes(surface):
+    return surface.get_pitch() * surface.get_height()
+
+class MapManager:
+    """Backgrounds and thumbnails for ``files`` ({loader name: image path}).
+
+    Backgrounds are scaled to ``size``; the least recently used are dropped
+    from the loader while they take more than ``budget_bytes``, but never the
+    newest or one named by ``keep()`` (the map in use), even over budget.
+    A missing file gives None, like the loader.
+    """
+    def __init__(self, loader, files, size, budget_bytes, thumb_size=(80, 60), keep=lambda: ()):
+        self.loader = loader
+        self.keep = keep
+        self.files = dict(files)
+        self.size = size
+        self.thumb_size = thumb_size
+        self.budget_bytes = budget_bytes
+        self.used = 0
+        self.evicted = 0
+        self._resident = OrderedDict()  # name -> bytes, least recently used first
+        self._requested = set()
+
+    def request(self, name, priority=0):
+        """Start decoding background ``name`` unless it is loaded or on its way."""
+        if name in self._requested or self.loader.ready(name):
+            return
+        self._requested.add(name)
+        path = self.files[name]
+        self.loader.request(name, lambda: self._decode(path), self._finish, priority,
+                            on_ready=lambda surface: self._loaded(name, surface))
+
+    def ready(self, name):
+        return self.loader.ready(name)
+
+    def get(self, name):
+        """Background ``name`` if it is loaded (marking it recently used), else None."""
+        surface = self.loader.get(name)
+        if surface is not None and name in self._resident:
+            self._resident.move_to_end(name)
+        return surface
+
+    def request_thumbnails(self, names=None, priority=1):
+        """Start making thumbnails for ``names`` (default: every file)."""
+        for name in names or self.files:
+            path = self.files[name]
+            self.loader.request(f"thumb:{name}", lambda path=path: self._decode_thumb(path),
+                                lambda img: img.convert() if img is not None else None, priority)
+
+    def thumbnail(self, name):
+        return self.loader.get(f"thumb:{name}")
+
+    def _decode(self, path):
+        if not os.path.isfile(path):
+            print("Image not found:", path)
+            return None
+        img = decode_at_most(path, self.size)
+        print("Loaded image:", os.path.basename(path))
+        return img
+
+    def _decode_thumb(self, path):
+        return make_thumbnail(path, self.thumb_size) if os.path.isfile(path) else None
+
+    def _finish(self, img):
+        if img is None:
+            return None
+        return pygame.transform.scale(img.convert(), self.size)
+
+    def _loaded(self, name, surface):
+        self._requested.discard(name)
+        if surface is None:
+            return
+        self._resident[name] = surface_bytes(surface)
+        self.used += self._resident[name]
+        if self.used <= self.budget_bytes:
+            return
+        kept = set(self.keep())
+        kept.add(name)
+        for old in [n for n in self._resident if n not in kept]:
+            if self.used <= self.budget_bytes:
+                break
+            self.used -= self._resident.pop(old)
+            self.evicted += 1
+            self.loader.discard(old)
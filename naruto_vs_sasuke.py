@@ -1,827 +1,1019 @@
-import pygame
-import numpy as np
-import os
-import sys
-import platform
-from time import time
-from PIL import Image
-
-# ================== Configuration ==================
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-ASSET_DIR = os.path.join(BASE_DIR, "asset")
-SPRITESHEET_PATH_NARUTO = os.path.join(ASSET_DIR, "sprites", "sheet.png")
-SPRITESHEET_PATH_SASUKE = os.path.join(ASSET_DIR, "sprites", "sheet2.png")
-SOUNDS_DIR = os.path.join(ASSET_DIR, "sounds")
-MAP_IMAGE_DIR = ASSET_DIR
-
-# Fireball images folder
-FIREBALL_DIR = os.path.join(ASSET_DIR, "fireball")
-
-# Runtime scale (you can change during play with +/-)
-INITIAL_SCALE = 1.0
-
-# Animation names (used when sheet provides multiple rows; for autoscan we put all frames into "idle")
-ANIM_NAMES = ["idle", "walk", "attack", "jump"]
-
-# Per-sheet slicing mode:
-SHEET_CFG_NARUTO = {"mode": "autoscan_row", "expected": 4, "crop_bottom_px": 64}
-SHEET_CFG_SASUKE = {"mode": "autoscan_row", "expected": 4, "crop_bottom_px": 64}
-
-# Shooting tuning
-BULLET_SPEED = 14
-BULLET_DAMAGE = 12
-SHOOT_COOLDOWN_FRAMES = 18  # ~3 shots/sec at 60 fps
-
-# ================== Pygame init ==================
-pygame.mixer.pre_init(44100, -16, 2, 1024)
-pygame.init()
-
-# ================== Background Music ==================
-def play_background_music():
-    music_path = os.path.join(ASSET_DIR, "game_music.mp3")
-    if os.path.isfile(music_path):
-        try:
-            pygame.mixer.music.load(music_path)
-            pygame.mixer.music.set_volume(0.3)
-            pygame.mixer.music.play(-1)
-            print("Background music playing...")
-        except Exception as e:
-            print("Music load failed:", e)
-    else:
-        print("No music file found at", music_path)
-
-play_background_music()
-
-print("Pygame:", pygame.get_sdl_version(), "Platform:", platform.platform())
-
-SCREEN_WIDTH, SCREEN_HEIGHT = 800, 600
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Naruto vs Sasuke")
-
-WHITE, RED, GREEN, BLACK = (255,255,255), (255,0,0), (0,255,0), (0,0,0)
-
-# ================== Sounds ==================
-def create_sound(freq=440, duration=0.1, vol=0.5):
-    sample_rate = 44100
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    wave = vol * np.sin(2 * np.pi * freq * t)
-    decay = np.linspace(1.0,0.1, wave.size)
-    wave *= decay
-    stereo = np.column_stack((wave, wave))
-    arr = (stereo * 32767).astype(np.int16)
-    arr = np.ascontiguousarray(arr)
-    return pygame.sndarray.make_sound(arr)
-
-def load_sound_file(filename):
-    path = os.path.join(SOUNDS_DIR, filename)
-    if os.path.isfile(path):
-        try:
-            return pygame.mixer.Sound(path)
-        except Exception as e:
-            print("Failed to load sound", path, e)
-    return None
-
-attack_sound = load_sound_file("attack.wav") or create_sound(880, 0.08, 0.5)
-hit_sound    = load_sound_file("hit.wav")    or create_sound(220, 0.12, 0.5)
-shoot_sound  = load_sound_file("shoot.wav")  or create_sound(1400, 0.05, 0.4)
-bg_music     = load_sound_file("bg_loop.wav") or create_sound(110, 1.0, 0.2)
-if bg_music:
-    try:
-        bg_music.set_volume(0.15)
-        bg_music.play(-1)
-    except Exception:
-        pass
-
-# ================== Maps ==================
-map_images = []
-for fn in ["forest.jpg", "village.jpg", "arena.jpg"]:
-    p = os.path.join(MAP_IMAGE_DIR, fn)
-    if os.path.isfile(p):
-        try:
-            img = pygame.image.load(p).convert()
-            img = pygame.transform.scale(img, (SCREEN_WIDTH, SCREEN_HEIGHT))
-            map_images.append(img)
-            print("Loaded map:", fn)
-        except Exception as e:
-            print("Failed to load map:", fn, e)
-
-if len(map_images) == 0:
-    map_images = None
-    print("No map images found — using color backgrounds.")
-map_colors = [(34,139,34), (139,69,19), (128,128,128)]
-
-# ================== Map Selection Background ==================
-map_select_bg = None
-map_select_bg_path = os.path.join(ASSET_DIR, "map_select_bg.png")
-if os.path.isfile(map_select_bg_path):
-    try:
-        img = pygame.image.load(map_select_bg_path).convert()
-        map_select_bg = pygame.transform.scale(img, (SCREEN_WIDTH, SCREEN_HEIGHT))
-        print("Loaded map selection background.")
-    except Exception as e:
-        print("Failed to load map selection background:", e)
-
-# ================== Sheet loading helpers ==================
-def pil_to_surface_alpha(img: Image.Image) -> pygame.Surface:
-    if img.mode != "RGBA":
-        img = img.convert("RGBA")
-    data = img.tobytes()
-    return pygame.image.fromstring(data, img.size, "RGBA").convert_alpha()
-
-def load_grid_sheet(sheet_path, cols, rows):
-    if not os.path.isfile(sheet_path):
-        print("Sprite sheet not found:", sheet_path)
-        return {}
-    img = Image.open(sheet_path).convert("RGBA")
-    W, H = img.size
-    fw, fh = W // cols, H // rows
-    animations = {}
-    for r in range(rows):
-        anim_name = ANIM_NAMES[r] if r < len(ANIM_NAMES) else f"row{r}"
-        frames = []
-        for c in range(cols):
-            box = (c*fw, r*fh, (c+1)*fw, (r+1)*fh)
-            frame = img.crop(box)
-            frames.append(pil_to_surface_alpha(frame))
-        animations[anim_name] = frames
-        print(f"Loaded {len(frames)} frames for {anim_name} (grid).")
-    img.close()
-    return animations
-
-def load_autoscan_row(sheet_path, expected=0, crop_bottom_px=0):
-    if not os.path.isfile(sheet_path):
-        print("Sprite sheet not found:", sheet_path)
-        return {}
-
-    img = Image.open(sheet_path).convert("RGBA")
-    W, H = img.size
-
-    if crop_bottom_px > 0 and crop_bottom_px < H:
-        img = img.crop((0, 0, W, H - crop_bottom_px))
-        W, H = img.size
-
-    px = np.array(img)
-    rgb = px[:, :, :3].astype(np.uint16)
-    brightness = (0.2126*rgb[:,:,0] + 0.7152*rgb[:,:,1] + 0.0722*rgb[:,:,2])
-    mask = brightness > 8
-    rgba = px.copy()
-    rgba[:, :, 3] = (mask * 255).astype(np.uint8)
-    img_clean = Image.fromarray(rgba, mode="RGBA")
-
-    col_nonempty = mask.any(axis=0)
-    regions = []
-    in_run = False
-    start = 0
-    for x in range(W):
-        if col_nonempty[x] and not in_run:
-            in_run = True; start = x
-        elif not col_nonempty[x] and in_run:
-            in_run = False; regions.append((start, x))
-    if in_run: regions.append((start, W))
-
-    filtered = [(a, b) for (a, b) in regions if (b - a) > 10]
-    if expected and len(filtered) > expected:
-        filtered = sorted(filtered, key=lambda r: (r[1]-r[0]), reverse=True)[:expected]
-        filtered = sorted(filtered, key=lambda r: r[0])
-
-    frames = []
-    for (x0, x1) in filtered:
-        slice_mask = mask[:, x0:x1]
-        if not slice_mask.any():
-            continue
-        ys = np.where(slice_mask.any(axis=1))[0]
-        y0, y1 = int(ys.min()), int(ys.max())+1
-        pad = 4
-        x0p = max(0, x0 - pad); x1p = min(W, x1 + pad)
-        y0p = max(0, y0 - pad); y1p = min(H, y1 + pad)
-        frame = img_clean.crop((x0p, y0p, x1p, y1p))
-        frames.append(pil_to_surface_alpha(frame))
-
-    if expected and len(frames) != expected:
-        print(f"[autoscan] Warning: expected ~{expected} frames, got {len(frames)}")
-
-    animations = {"idle": frames if frames else []}
-    print(f"Loaded {len(frames)} frames via autoscan.")
-    return animations
-
-def load_sheet_by_cfg(path, cfg):
-    mode = cfg.get("mode", "grid")
-    if mode == "grid":
-        cols = int(cfg.get("cols", 4)); rows = int(cfg.get("rows", 1))
-        return load_grid_sheet(path, cols, rows)
-    elif mode == "autoscan_row":
-        expected = int(cfg.get("expected", 0)); crop = int(cfg.get("crop_bottom_px", 0))
-        return load_autoscan_row(path, expected=expected, crop_bottom_px=crop)
-    else:
-        print(f"Unknown mode '{mode}' for {os.path.basename(path)}; defaulting to grid 4x1.")
-        return load_grid_sheet(path, 4, 1)
-
-def rescale_animations(anims, factor: float):
-    if not anims:
-        return {}
-    scaled = {}
-    for k, frames in anims.items():
-        new_list = []
-        for f in frames:
-            w, h = f.get_width(), f.get_height()
-            nw, nh = max(1, int(round(w*factor))), max(1, int(round(h*factor)))
-            try:
-                sf = pygame.transform.smoothscale(f, (nw, nh)).convert_alpha()
-            except Exception:
-                sf = pygame.transform.scale(f, (nw, nh)).convert_alpha()
-            new_list.append(sf)
-        scaled[k] = new_list
-    return scaled
-
-# ================== Load character animations ==================
-orig_naruto_animations = load_sheet_by_cfg(SPRITESHEET_PATH_NARUTO, SHEET_CFG_NARUTO)
-orig_sasuke_animations = load_sheet_by_cfg(SPRITESHEET_PATH_SASUKE, SHEET_CFG_SASUKE)
-
-# ================== Load Fireball frames (original sizes) ==================
-orig_fireball_frames = []
-if os.path.isdir(FIREBALL_DIR):
-    # Expecting image0.png ... image76.png
-    for i in range(77):
-        fn = os.path.join(FIREBALL_DIR, f"image{i}.png")
-        if os.path.isfile(fn):
-            try:
-                img = pygame.image.load(fn).convert_alpha()
-                orig_fireball_frames.append(img)
-            except Exception as e:
-                print("Failed to load fireball frame", fn, e)
-        else:
-            # missing frames will just be skipped
-            pass
-else:
-    print("FIREBALL_DIR not found:", FIREBALL_DIR)
-
-if not orig_fireball_frames:
-    print("⚠️ No fireball frames loaded! Shooting will fall back to simple drawing.")
-
-def rescale_fireballs(frames, factor: float):
-    if not frames:
-        return []
-    scaled = []
-    for f in frames:
-        w, h = f.get_width(), f.get_height()
-        nw, nh = max(1, int(round(w * factor))), max(1, int(round(h * factor)))
-        try:
-            sf = pygame.transform.smoothscale(f, (nw, nh)).convert_alpha()
-        except Exception:
-            sf = pygame.transform.scale(f, (nw, nh)).convert_alpha()
-        scaled.append(sf)
-    return scaled
-
-# runtime scale and scaled assets
-runtime_scale = float(INITIAL_SCALE)
-naruto_animations = rescale_animations(orig_naruto_animations, runtime_scale)
-sasuke_animations = rescale_animations(orig_sasuke_animations, runtime_scale)
-fireball_frames = rescale_fireballs(orig_fireball_frames, runtime_scale)
-
-# ================== Bullets ==================
-class Bullet:
-    __slots__ = ("x", "y", "vx", "owner", "frame_idx")
-    def __init__(self, x, y, facing_right, owner):
-        self.x = float(x)
-        self.y = float(y)
-        self.vx = float(BULLET_SPEED if facing_right else -BULLET_SPEED)
-        self.owner = owner  # "Naruto" or "Sasuke"
-        self.frame_idx = 0
-
-    def update(self):
-        self.x += self.vx
-        if fireball_frames:
-            self.frame_idx = (self.frame_idx + 1) % len(fireball_frames)
-        else:
-            self.frame_idx = (self.frame_idx + 1) % 1
-
-    def offscreen(self):
-        # allow some margin
-        return (self.x < -200) or (self.x > SCREEN_WIDTH + 200)
-
-    def rect(self):
-        """Return a pygame.Rect for collisions based on the current frame or a small fallback rect."""
-        if fireball_frames:
-            fr = fireball_frames[self.frame_idx]
-            r = fr.get_rect(center=(int(self.x), int(self.y)))
-            return r
-        else:
-            # fallback small circle rect
-            r = pygame.Rect(0, 0, 16, 16)
-            r.center = (int(self.x), int(self.y))
-            return r
-
-    def draw(self, surface):
-        if fireball_frames:
-            fr = fireball_frames[self.frame_idx]
-            # flip horizontally if moving left
-            if self.vx < 0:
-                fr = pygame.transform.flip(fr, True, False)
-            r = fr.get_rect(center=(int(self.x), int(self.y)))
-            surface.blit(fr, r.topleft)
-        else:
-            # fallback simple visual
-            pygame.draw.circle(surface, (255, 140, 0), (int(self.x), int(self.y)), 8)
-            pygame.draw.circle(surface, BLACK, (int(self.x), int(self.y)), 8, 1)
-
-bullets = []
-
-# ================== Character ==================
-def _pressed(keys, key_or_keys):
-    if isinstance(key_or_keys, (list, tuple)):
-        return any(keys[k] for k in key_or_keys)
-    return keys[key_or_keys]
-
-class Character:
-    def __init__(self, x, ground_y, name, controls, sprites=None, facing_right=True):
-        self.name = name
-        self.controls = controls
-        self.base_anims = sprites or {}
-        self.animations = sprites or {}
-        self.anim_state = "idle"
-        self.anim_tick = 0
-        self.frame_duration = 6
-        self.facing_right = facing_right
-
-        self.vel = 5
-        self.jump_power = 15
-        self.gravity = 0.8
-        self.vy = 0.0
-        self.health = 100
-        self.is_jumping = False
-        self.is_attacking = False
-        self.attack_cooldown = 0
-        self.shoot_cooldown = 0
-
-        self.midbottom_x = x
-        self.midbottom_y = ground_y
-
-        w, h = 50, 80
-        fr = self._peek_frame()
-        if fr is not None:
-            w, h = fr.get_width(), fr.get_height()
-        self.rect = pygame.Rect(0, 0, w, h)
-        self.rect.midbottom = (self.midbottom_x, self.midbottom_y)
-
-    def _peek_frame(self):
-        if not self.animations:
-            return None
-        for k in ["idle", "walk", "attack", "jump"]:
-            frames = self.animations.get(k, [])
-            if frames:
-                return frames[0]
-        for frames in self.animations.values():
-            if frames:
-                return frames[0]
-        return None
-
-    def current_frame(self):
-        frames = self.animations.get(self.anim_state)
-        if not frames:
-            for key in ["idle", "walk", "attack", "jump"]:
-                frames = self.animations.get(key)
-                if frames:
-                    break
-        if not frames:
-            return None
-        idx = (self.anim_tick // self.frame_duration) % len(frames)
-        return frames[idx]
-
-    def apply_scaled_animations(self, scaled):
-        self.animations = scaled or {}
-        fr = self._peek_frame()
-        if fr is not None:
-            self.rect.size = (fr.get_width(), fr.get_height())
-            self.rect.midbottom = (self.midbottom_x, int(self.midbottom_y))
-
-    def move_and_actions(self, keys, ground_y):
-        """Moves, handles jump/melee/shoot. Returns a Bullet or None when shooting."""
-        prev_state = self.anim_state
-        self.anim_state = "idle"
-        shot_bullet = None
-
-        try:
-            if _pressed(keys, self.controls["left"]):
-                self.midbottom_x -= self.vel
-                self.facing_right = False
-                self.anim_state = "walk"
-            if _pressed(keys, self.controls["right"]):
-                self.midbottom_x += self.vel
-                self.facing_right = True
-                self.anim_state = "walk"
-            if _pressed(keys, self.controls["jump"]) and not self.is_jumping:
-                self.vy = -self.jump_power
-                self.is_jumping = True
-            # Melee
-            if _pressed(keys, self.controls["attack"]) and self.attack_cooldown <= 0:
-                self.is_attacking = True
-                self.attack_cooldown = 30
-                try: attack_sound.play()
-                except Exception: pass
-            # Shoot
-            if _pressed(keys, self.controls["shoot"]) and self.shoot_cooldown <= 0:
-                chest_y = self.rect.centery - self.rect.height * 0.1
-                muzzle_x = self.rect.right if self.facing_right else self.rect.left
-                shot_bullet = Bullet(muzzle_x, chest_y, self.facing_right, self.name)
-                self.shoot_cooldown = SHOOT_COOLDOWN_FRAMES
-                try: shoot_sound.play()
-                except Exception: pass
-        except Exception:
-            pass
-
-        if self.is_attacking:
-            self.anim_state = "attack"
-
-        if self.anim_state != prev_state:
-            self.anim_tick = 0
-        else:
-            self.anim_tick += 1
-
-        # Gravity
-        self.vy += self.gravity
-        self.midbottom_y += self.vy
-
-        # Update rect to current frame (size may change)
-        fr = self.current_frame()
-        if fr:
-            self.rect.size = (fr.get_width(), fr.get_height())
-        self.rect.midbottom = (int(self.midbottom_x), int(self.midbottom_y))
-
-        # Ground clamp
-        if self.rect.bottom > ground_y:
-            self.rect.bottom = ground_y
-            self.midbottom_y = self.rect.bottom
-            self.vy = 0
-            self.is_jumping = False
-
-        # Screen clamp horizontally
-        self.rect.x = max(0, min(self.rect.x, SCREEN_WIDTH - self.rect.width))
-        self.midbottom_x = self.rect.midbottom[0]
-
-        # Cooldowns
-        if self.attack_cooldown > 0:
-            self.attack_cooldown -= 1
-        else:
-            self.is_attacking = False
-
-        if self.shoot_cooldown > 0:
-            self.shoot_cooldown -= 1
-
-        return shot_bullet
-
-    def draw(self, surface):
-        fr = self.current_frame()
-        if fr:
-            sprite = pygame.transform.flip(fr, True, False) if not self.facing_right else fr
-            r = sprite.get_rect()
-            r.midbottom = self.rect.midbottom
-            surface.blit(sprite, r.topleft)
-        else:
-            color = (255,165,0) if self.name == "Naruto" else (0,0,255)
-            pygame.draw.rect(surface, color, self.rect)
-
-    def get_attack_rect(self):
-        w = max(20, int(self.rect.width * 0.5))
-        h = max(20, int(self.rect.height * 0.3))
-        offset = int(self.rect.width * 0.6) if self.facing_right else -int(self.rect.width * 1.1)
-        x = self.rect.centerx + offset
-        y = self.rect.centery - h//2
-        return pygame.Rect(x, y, w, h)
-
-# ================== UI helpers ==================
-def draw_health_bar(x, y, health):
-    pygame.draw.rect(screen, RED, (x, y, 100, 10))
-    pygame.draw.rect(screen, GREEN, (x, y, max(0, int(health)), 10))
-
-leaderboard = []
-def update_leaderboard(winner_name):
-    leaderboard.append({"name": winner_name, "time": pygame.time.get_ticks() // 1000})
-    leaderboard.sort(key=lambda x: x["time"], reverse=True)
-    del leaderboard[5:]
-
-def draw_leaderboard():
-    font = pygame.font.SysFont(None, 32)
-    text = font.render("Leaderboard", True, WHITE)
-    screen.blit(text, (SCREEN_WIDTH//2 - 100, 50))
-    for i, entry in enumerate(leaderboard):
-        text = font.render(f"{i+1}. {entry['name']} - {entry['time']}s", True, WHITE)
-        screen.blit(text, (SCREEN_WIDTH//2 - 100, 100 + i*28))
-
-# ================== Menu System ==================
-class Button:
-    def __init__(self, text, x, y, w, h, callback, font_size=36):
-        self.text = text
-        self.rect = pygame.Rect(x, y, w, h)
-        self.callback = callback
-        self.font = pygame.font.SysFont(None, font_size)
-
-    def draw(self, surface, hover=False):
-        color = (200,200,200) if hover else (255,255,255)
-        pygame.draw.rect(surface, (50,50,50), self.rect, border_radius=12)
-        pygame.draw.rect(surface, color, self.rect, 2, border_radius=12)
-        text = self.font.render(self.text, True, color)
-        surface.blit(text, (self.rect.centerx - text.get_width()//2,
-                            self.rect.centery - text.get_height()//2))
-
-    def check_click(self, pos):
-        if self.rect.collidepoint(pos):
-            try:
-                self.callback()
-            except Exception as e:
-                print("Button callback error:", e)
-
-def set_state(state):
-    global game_state
-    game_state = state
-
-def start_game(): set_state("map_selection")
-def show_controls(): set_state("controls")
-def resume_game(): set_state("playing")
-def quit_game():
-    try:
-        pygame.quit()
-    finally:
-        sys.exit(0)
-
-# Map selection helpers
-maps = ["Forest", "Village", "Arena"]
-selected_map = None
-
-def map_item_rect(i):
-    return pygame.Rect(SCREEN_WIDTH//2 - 120, 140 + i*90, 240, 64)
-
-# Buttons
-start_buttons = [
-    Button("Start", SCREEN_WIDTH//2 - 100, 250, 200, 60, start_game),
-    Button("Controls", SCREEN_WIDTH//2 - 100, 350, 200, 60, show_controls),
-    Button("Quit", SCREEN_WIDTH//2 - 100, 450, 200, 60, quit_game),
-]
-back_btn = Button("Back", SCREEN_WIDTH//2 - 60, SCREEN_HEIGHT - 100, 120, 50, lambda: set_state("start_menu"))
-pause_buttons = [
-    Button("Resume", SCREEN_WIDTH//2 - 100, 250, 200, 60, resume_game),
-    Button("Back to Menu", SCREEN_WIDTH//2 - 100, 350, 200, 60, lambda: set_state("start_menu")),
-]
-
-# Screens
-def draw_start_menu():
-    screen.fill(BLACK)
-    title_font = pygame.font.SysFont(None, 64)
-    title = title_font.render("Naruto vs Sasuke", True, WHITE)
-    screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 90))
-    for btn in start_buttons:
-        hover = btn.rect.collidepoint(pygame.mouse.get_pos())
-        btn.draw(screen, hover)
-
-def draw_controls_screen():
-    screen.fill(BLACK)
-    font = pygame.font.SysFont(None, 32)
-    lines = [
-        "Controls:",
-        "Naruto: Arrows, melee=Down, SHOOT=Right Ctrl",
-        "Sasuke: WASD, melee=S, SHOOT=Left Ctrl",
-        "+/- resize, P to pause, R to restart after KO",
-        "Select map with mouse.",
-    ]
-    for i, line in enumerate(lines):
-        text = font.render(line, True, WHITE)
-        screen.blit(text, (50, 120 + i*40))
-    hover = back_btn.rect.collidepoint(pygame.mouse.get_pos())
-    back_btn.draw(screen, hover)
-
-def draw_map_selection():
-    if map_select_bg:
-        screen.blit(map_select_bg, (0, 0))
-    else:
-        screen.fill(BLACK)
-
-    font = pygame.font.SysFont(None, 36)
-    title = font.render("Select a Map", True, WHITE)
-    screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 40))
-
-    for i, m in enumerate(maps):
-        rect = map_item_rect(i)
-        color = GREEN if selected_map == i else WHITE
-        pygame.draw.rect(screen, (50, 50, 50), rect, border_radius=12)
-        pygame.draw.rect(screen, color, rect, 2, border_radius=12)
-        text = font.render(m, True, color)
-        screen.blit(text, (rect.centerx - text.get_width()//2,
-                           rect.centery - text.get_height()//2))
-
-    hint = font.render("Click a map to start playing", True, WHITE)
-    screen.blit(hint, (SCREEN_WIDTH//2 - hint.get_width()//2, SCREEN_HEIGHT - 60))
-    
-    # Draw Back button
-    hover = back_btn.rect.collidepoint(pygame.mouse.get_pos())
-    back_btn.draw(screen, hover)
-
-def draw_pause_menu():
-    overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0,0,0,180))
-    screen.blit(overlay, (0,0))
-    font = pygame.font.SysFont(None, 48)
-    title = font.render("Paused", True, WHITE)
-    screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 150))
-    for btn in pause_buttons:
-        hover = btn.rect.collidepoint(pygame.mouse.get_pos())
-        btn.draw(screen, hover)
-
-# ================== Instantiate Characters ==================
-GROUND_Y = SCREEN_HEIGHT - 20  # feet a bit above bottom
-
-naruto = Character(150, GROUND_Y, "Naruto", {
-    "left": pygame.K_LEFT, "right": pygame.K_RIGHT, "jump": pygame.K_UP,
-    "attack": pygame.K_DOWN, "shoot": pygame.K_RCTRL
-}, sprites=naruto_animations, facing_right=True)
-
-sasuke = Character(650, GROUND_Y, "Sasuke", {
-    "left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w,
-    "attack": pygame.K_s, "shoot": pygame.K_LCTRL
-}, sprites=sasuke_animations, facing_right=False)
-
-# ================== Game Loop ==================
-clock = pygame.time.Clock()
-FPS = 60
-game_over = False
-game_state = "start_menu"  # first screen
-running = True
-winner = ""
-
-print("Controls:")
-print("  Naruto: Arrows, melee=Down, SHOOT=Right Ctrl")
-print("  Sasuke: WASD, melee=S, SHOOT=Left Ctrl")
-print("  Flow: Start Menu -> Map Selection (mouse) -> Play. +/- to resize, P to pause, R to restart after KO.")
-
-def rescale_both():
-    global naruto_animations, sasuke_animations, fireball_frames
-    naruto_animations = rescale_animations(orig_naruto_animations, runtime_scale)
-    sasuke_animations = rescale_animations(orig_sasuke_animations, runtime_scale)
-    fireball_frames = rescale_fireballs(orig_fireball_frames, runtime_scale)
-    naruto.apply_scaled_animations(naruto_animations)
-    sasuke.apply_scaled_animations(sasuke_animations)
-
-start_time = time()
-try:
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-
-            # Mouse clicks for menus
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                if game_state == "start_menu":
-                    for btn in start_buttons:
-                        btn.check_click(event.pos)
-                elif game_state == "controls":
-                    back_btn.check_click(event.pos)
-                elif game_state == "map_selection":
-                    # Choose a map by clicking; then go to playing
-                    for i in range(len(maps)):
-                        if map_item_rect(i).collidepoint(event.pos):
-                            selected_map = i
-                            game_state = "playing"
-                    back_btn.check_click(event.pos)
-                elif game_state == "paused":
-                    for btn in pause_buttons:
-                        btn.check_click(event.pos)
-
-            # Keys (resize, pause, and restart)
-            if event.type == pygame.KEYDOWN:
-                # Resize
-                if event.key in (pygame.K_KP_PLUS,) or getattr(event, "unicode", "") == "+":
-                    runtime_scale = min(4.0, round(INITIAL_SCALE if 'runtime_scale' not in globals() else runtime_scale + 0.1, 2))
-                    rescale_both()
-                    print(f"Scale -> {runtime_scale:.2f}")
-                elif event.key in (pygame.K_KP_MINUS,) or getattr(event, "unicode", "") == "-":
-                    runtime_scale = max(0.5, round(INITIAL_SCALE if 'runtime_scale' not in globals() else runtime_scale - 0.1, 2))
-                    rescale_both()
-                    print(f"Scale -> {runtime_scale:.2f}")
-                # Pause
-                elif event.key == pygame.K_p and game_state == "playing" and not game_over:
-                    game_state = "paused"
-                elif event.key == pygame.K_p and game_state == "paused":
-                    game_state = "playing"
-                # Restart after KO
-                elif game_state == "playing" and game_over and event.key == pygame.K_r:
-                    naruto.health = sasuke.health = 100
-                    naruto.midbottom_x, naruto.midbottom_y = (150, GROUND_Y)
-                    sasuke.midbottom_x, sasuke.midbottom_y = (650, GROUND_Y)
-                    naruto.vy = sasuke.vy = 0
-                    naruto.is_jumping = sasuke.is_jumping = False
-                    naruto.is_attacking = sasuke.is_attacking = False
-                    naruto.attack_cooldown = sasuke.attack_cooldown = 0
-                    naruto.shoot_cooldown = sasuke.shoot_cooldown = 0
-                    bullets.clear()
-                    rescale_both()
-                    game_over = False
-                    game_state = "map_selection"
-                    selected_map = None
-                    winner = ""
-
-        # ====== State-specific update & draw ======
-        if game_state == "start_menu":
-            draw_start_menu()
-
-        elif game_state == "controls":
-            draw_controls_screen()
-
-        elif game_state == "map_selection":
-            draw_map_selection()
-
-        elif game_state == "paused":
-            if map_images and selected_map is not None and selected_map < len(map_images):
-                screen.blit(map_images[selected_map], (0, 0))
-            else:
-                screen.fill(map_colors[selected_map] if selected_map is not None else WHITE)
-            naruto.draw(screen)
-            sasuke.draw(screen)
-            for bullet in bullets:
-                bullet.draw(screen)
-            draw_health_bar(50, 20, naruto.health)
-            draw_health_bar(SCREEN_WIDTH-150, 20, sasuke.health)
-            draw_pause_menu()
-
-        elif game_state == "playing":
-            if not game_over:
-                keys = pygame.key.get_pressed()
-
-                # Move + actions (may return a bullet)
-                b1 = naruto.move_and_actions(keys, GROUND_Y)
-                b2 = sasuke.move_and_actions(keys, GROUND_Y)
-                if b1: bullets.append(b1)
-                if b2: bullets.append(b2)
-
-                # Melee hits
-                if naruto.is_attacking and naruto.get_attack_rect().colliderect(sasuke.rect):
-                    sasuke.health -= 5
-                    try: hit_sound.play()
-                    except Exception: pass
-                if sasuke.is_attacking and sasuke.get_attack_rect().colliderect(naruto.rect):
-                    naruto.health -= 5
-                    try: hit_sound.play()
-                    except Exception: pass
-
-                # Bullets update + collisions
-                for bullet in bullets[:]:
-                    bullet.update()
-                    r = bullet.rect()
-                    # test collision with the OTHER player only
-                    if bullet.owner == "Naruto":
-                        if r.colliderect(sasuke.rect):
-                            sasuke.health -= BULLET_DAMAGE
-                            try: hit_sound.play()
-                            except Exception: pass
-                            try: bullets.remove(bullet)
-                            except ValueError: pass
-                            continue
-                    else:
-                        if r.colliderect(naruto.rect):
-                            naruto.health -= BULLET_DAMAGE
-                            try: hit_sound.play()
-                            except Exception: pass
-                            try: bullets.remove(bullet)
-                            except ValueError: pass
-                            continue
-                    if bullet.offscreen():
-                        try: bullets.remove(bullet)
-                        except ValueError: pass
-
-                if naruto.health <= 0 or sasuke.health <= 0:
-                    winner = "Sasuke" if naruto.health <= 0 else "Naruto"
-                    update_leaderboard(winner)
-                    game_over = True
-
-            # Background
-            if map_images and selected_map is not None and selected_map < len(map_images):
-                screen.blit(map_images[selected_map], (0, 0))
-            else:
-                screen.fill(map_colors[selected_map] if selected_map is not None else WHITE)
-
-            # Draw players
-            naruto.draw(screen)
-            sasuke.draw(screen)
-
-            # Draw bullets
-            for bullet in bullets:
-                bullet.draw(screen)
-
-            # UI
-            draw_health_bar(50, 20, naruto.health)
-            draw_health_bar(SCREEN_WIDTH-150, 20, sasuke.health)
-
-            if game_over:
-                overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-                overlay.fill((0,0,0,180))
-                screen.blit(overlay, (0,0))
-                font = pygame.font.SysFont(None, 48)
-                winner_text = font.render(f"{winner} Wins! Press R to Restart", True, WHITE)
-                screen.blit(winner_text, (SCREEN_WIDTH//2 - 240, SCREEN_HEIGHT//2 - 20))
-                draw_leaderboard()
-        pygame.display.flip()
-        clock.tick(FPS)
-
-finally:
-    elapsed = time() - start_time
-    print(f"Exiting after {elapsed:.2f} sec")
-    try: pygame.quit()
-    except Exception: pass
-    sys.exit(0)
\ No newline at end of file
+import pygame
+import os
+import sys
+import platform
+from collections import deque
+from time import perf_counter, strftime, time
+
+from simulation import (
+    ANIM_NAMES, SCREEN_WIDTH, SCREEN_HEIGHT, GROUND_Y, INPUT_BITS, Fighter, FixedTimestep,
+    MatchState, party_roster, step,
+)
+from audio import VoiceManager, tone
+from bots import CPU_LEVELS, CpuBot
+from assets import AssetIndex, AssetLoader, decode_all
+from maps import MapManager
+from profiler import FrameProfiler, percentiles
+from telemetry import Telemetry
+from render import SCALE_FILTERS, Backdrop, DirtyRectRenderer, ScaledDisplay, overlay, text
+from netplay import RollbackSession, UdpTransport, parse_addr
+from replay import ReplayRecorder, load_replay
+from sprites import CollisionMasks, ScaledFrameCache, convert_frames, load_sheet_cached, local_frame
+
+# ================== Configuration ==================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSET_DIR = os.path.join(BASE_DIR, "asset")
+SPRITESHEET_PATH_NARUTO = os.path.join(ASSET_DIR, "sprites", "sheet.png")
+SPRITESHEET_PATH_SASUKE = os.path.join(ASSET_DIR, "sprites", "sheet2.png")
+SOUNDS_DIR = os.path.join(ASSET_DIR, "sounds")
+MAP_IMAGE_DIR = ASSET_DIR
+
+# Fireball images folder
+FIREBALL_DIR = os.path.join(ASSET_DIR, "fireball")
+
+# Runtime scale (you can change during play with +/-)
+INITIAL_SCALE = 1.0
+# Memory for scaled frame sets kept around so revisiting a scale is free
+SCALE_CACHE_BUDGET_MB = 64
+# Memory for decoded backgrounds (maps.py; 1.9 MB each at 800x600). Ones not
+# shown lately are dropped past this and decoded again when picked again; the
+# selected map never is.
+MAP_CACHE_BUDGET_MB = float(os.environ.get("NVS_MAP_CACHE_MB", 4))
+
+# The match always advances at SIM_HZ steps per second; drawing runs at up to
+# RENDER_FPS (0 = as fast as the display allows) and interpolates positions
+# between steps. After a stall at most MAX_CATCHUP_STEPS run in one frame.
+SIM_HZ = 60
+RENDER_FPS = 60
+MAX_CATCHUP_STEPS = 5
+
+# Hits test the sprites' opaque pixels (masks built at load/rescale time)
+# once the boxes meet; False goes back to plain box hits.
+PIXEL_COLLISION = True
+
+# Every finished match's inputs are saved to REPLAY_DIR (a few KB each).
+# Set NVS_REPLAY to a replay file to watch it instead of playing; hold Tab to
+# fast-forward REPLAY_FAST_FORWARD times. python replay.py *.nvsr re-runs
+# replays headless and checks they still end the same way.
+RECORD_REPLAYS = True
+REPLAY_DIR = os.path.join(BASE_DIR, "replays")
+REPLAY_PATH = os.environ.get("NVS_REPLAY")
+REPLAY_FAST_FORWARD = 8
+
+# Online versus over UDP with rollback: NVS_NETPLAY="<side>,<local port>,<peer host:port>"
+# (side 0 plays Naruto, 1 Sasuke), e.g. on one box:
+#   NVS_NETPLAY=0,7000,127.0.0.1:7001  and  NVS_NETPLAY=1,7001,127.0.0.1:7000
+# NVS_NET_DELAY_MS / NVS_NET_LOSS fake one-way latency and packet loss for testing.
+NETPLAY = os.environ.get("NVS_NETPLAY")
+NET_DELAY_MS = float(os.environ.get("NVS_NET_DELAY_MS", 0))
+NET_LOSS = float(os.environ.get("NVS_NET_LOSS", 0))
+NET_INPUT_DELAY = 2   # frames; the rest of the latency is hidden by rollback
+NET_MAX_ROLLBACK = 8  # frames; beyond this the faster side waits
+NET_MAP = 0
+
+# Party mode: NVS_PARTY_SIZE fighters (2-8) in NVS_PARTY_TEAMS teams (0 =
+# free-for-all). The first two are on the keyboard; the rest are CPU fighters.
+# Online matches are always one on one.
+PARTY_SIZE = max(2, min(8, int(os.environ.get("NVS_PARTY_SIZE", 2))))
+PARTY_TEAMS = int(os.environ.get("NVS_PARTY_TEAMS", 0))
+
+# CPU opponent (bots.CpuBot): NVS_CPU lists the fighters it plays as well,
+# counting from 1 ("2" = Sasuke, "1,2" to watch). NVS_CPU_LEVEL (easy, normal,
+# hard) sets how long it may think per frame and how far ahead it looks; all
+# CPU fighters share that one budget, which stays well under a 60 Hz frame.
+CPU_PLAYERS = {int(i) for i in os.environ.get("NVS_CPU", "").split(",") if i.strip()}
+CPU_LEVEL = os.environ.get("NVS_CPU_LEVEL", "normal")
+if CPU_LEVEL not in CPU_LEVELS:
+    print(f"Unknown CPU level {CPU_LEVEL!r}, using normal; choose from {sorted(CPU_LEVELS)}")
+    CPU_LEVEL = "normal"
+
+# Match telemetry (telemetry.py): shots, hits, KOs and a summary per match
+# go to TELEMETRY_DIR from a background thread, as rotating JSONL or, with
+# NVS_TELEMETRY_FORMAT=bin, zlib-compressed blocks. Replays aren't logged.
+TELEMETRY = True
+TELEMETRY_DIR = os.path.join(BASE_DIR, "telemetry")
+TELEMETRY_FORMAT = os.environ.get("NVS_TELEMETRY_FORMAT", "jsonl")
+
+# Menus, pause and game-over screens are only redrawn when what they show
+# changes (a hover, a click, an asset arriving). In between the loop sleeps
+# until input comes, waking every IDLE_WAIT_MS so background loading and an
+# online peer still get their turn.
+IDLE_WAIT_MS = 100
+
+# Redraw only the areas around fighters, bullets and health bars during a
+# match and push them with pygame.display.update(rects) instead of flip().
+DIRTY_RECTS = False
+
+# The game always draws at SCREEN_WIDTH x SCREEN_HEIGHT. With NVS_WINDOW_SIZE
+# (say 1920x1080) or NVS_FULLSCREEN=1 it draws into an off-screen buffer of
+# that size, scaled to the window once per frame (render.ScaledDisplay), so
+# drawing costs the same on any screen. NVS_RENDER_FILTER: "integer" (whole
+# multiples, crisp pixels, black borders) or "smooth" (fills the window).
+WINDOW_SIZE = tuple(int(v) for v in os.environ.get("NVS_WINDOW_SIZE", "0x0").lower().split("x"))
+FULLSCREEN = os.environ.get("NVS_FULLSCREEN") == "1"
+RENDER_FILTER = os.environ.get("NVS_RENDER_FILTER", "integer")
+
+# Frame profiler: F3 toggles the on-screen p50/p99 overlay. Set NVS_PROFILE_TRACE
+# to a .csv or .json path to also write every frame's phase timings on exit.
+PROFILE_OVERLAY = False
+PROFILE_TRACE_PATH = os.environ.get("NVS_PROFILE_TRACE")
+
+# Mixer channels reserved per sound group: (channels, minimum ms between two
+# starts of the same sound). A full group cuts off its oldest voice. A melee
+# swing only sounds on the first frame it hits someone (play_match_sounds).
+# Synthesized fallback sounds are cached in .cache/sounds.
+SOUND_GROUPS = {"music": (1, 0), "attack": (2, 80), "shoot": (3, 50), "hit": (3, 50)}
+
+# Per-sheet slicing mode: "grid" (cols x rows), "autoscan_row" (one row of
+# frames, all idle) or "autoscan" (rows of frames found on their own; row r
+# is ANIM_NAMES[r], or the "rows" list of names if given).
+SHEET_CFG_NARUTO = {"mode": "autoscan_row", "expected": 4, "crop_bottom_px": 64}
+SHEET_CFG_SASUKE = {"mode": "autoscan_row", "expected": 4, "crop_bottom_px": 64}
+
+# Arena size, ANIM_NAMES and shooting tuning (BULLET_SPEED, BULLET_DAMAGE,
+# SHOOT_COOLDOWN_FRAMES) live in simulation.py so headless runs share them.
+
+# ================== Pygame init ==================
+pygame.mixer.pre_init(44100, -16, 2, 1024)
+pygame.init()
+
+# Asset file names are matched case-insensitively (assets.py)
+asset_index = AssetIndex()
+
+def asset_path(path):
+    """``path`` as spelled on disk, or unchanged if there is no such file."""
+    return asset_index.find(path) or path
+
+# ================== Background Music ==================
+def play_background_music():
+    music_path = asset_path(os.path.join(ASSET_DIR, "game_music.mp3"))
+    if os.path.isfile(music_path):
+        try:
+            pygame.mixer.music.load(music_path)
+            pygame.mixer.music.set_volume(0.3)
+            pygame.mixer.music.play(-1)
+            print("Background music playing...")
+        except Exception as e:
+            print("Music load failed:", e)
+    else:
+        print("No music file found at", music_path)
+
+play_background_music()
+
+print("Pygame:", pygame.get_sdl_version(), "Platform:", platform.platform())
+
+if RENDER_FILTER not in SCALE_FILTERS:
+    print(f"Unknown render filter {RENDER_FILTER!r}, using integer; choose from {SCALE_FILTERS}")
+    RENDER_FILTER = "integer"
+if FULLSCREEN or WINDOW_SIZE not in ((0, 0), (SCREEN_WIDTH, SCREEN_HEIGHT)):
+    window = ScaledDisplay((SCREEN_WIDTH, SCREEN_HEIGHT), (0, 0) if FULLSCREEN else WINDOW_SIZE, RENDER_FILTER,
+                           pygame.FULLSCREEN if FULLSCREEN else pygame.RESIZABLE)
+    screen = window.surface
+    display = window
+else:
+    window = None  # draw straight on the display
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    display = pygame.display
+pygame.display.set_caption("Naruto vs Sasuke")
+
+def mouse_pos(pos=None):
+    """The mouse position (or an event's ``pos``) in screen coordinates."""
+    pos = pygame.mouse.get_pos() if pos is None else pos
+    return window.to_surface(pos) if window is not None else pos
+
+WHITE, RED, GREEN, BLACK = (255,255,255), (255,0,0), (0,255,0), (0,0,0)
+
+# ================== Sounds ==================
+def load_sound_file(filename):
+    path = asset_index.find(os.path.join(SOUNDS_DIR, filename))
+    if path is not None:
+        try:
+            return pygame.mixer.Sound(path)
+        except Exception as e:
+            print("Failed to load sound", path, e)
+    return None
+
+voices = VoiceManager(SOUND_GROUPS)
+attack_sound = load_sound_file("attack.wav") or tone(880, 0.08, 0.5)
+hit_sound    = load_sound_file("hit.wav")    or tone(220, 0.12, 0.5)
+shoot_sound  = load_sound_file("shoot.wav")  or tone(1400, 0.05, 0.4)
+bg_music     = load_sound_file("bg_loop.wav") or tone(110, 1.0, 0.2)
+if bg_music:
+    bg_music.set_volume(0.15)
+    voices.play("music", bg_music, loops=-1)
+
+# ================== Asset loading ==================
+# Only what the start menu needs is ready before the first frame. Maps, sprite
+# sheets and fireballs stream in on a worker thread (assets.py) while the
+# menus run; the "loading" state waits for whatever the chosen match needs.
+loader = AssetLoader()
+scale_cache = ScaledFrameCache(SCALE_CACHE_BUDGET_MB * 1024 * 1024)
+collision_masks = CollisionMasks()
+
+# ================== Maps ==================
+MAP_FILES = ["forest.jpg", "village.jpg", "arena.jpg"]
+map_colors = [(34,139,34), (139,69,19), (128,128,128)]
+# map_select_bg.jpg is a different picture, not a smaller copy of this one
+MAP_SELECT_BG = "map_select_bg.png"
+
+# Only the map that was picked is decoded; the selection screen shows thumbnails
+background_files = {f"map:{i}": asset_path(os.path.join(MAP_IMAGE_DIR, f)) for i, f in enumerate(MAP_FILES)}
+background_files["map_select_bg"] = asset_path(os.path.join(ASSET_DIR, MAP_SELECT_BG))
+backgrounds = MapManager(loader, background_files, (SCREEN_WIDTH, SCREEN_HEIGHT),
+                         int(MAP_CACHE_BUDGET_MB * 1024 * 1024), keep=lambda: match_assets())
+backgrounds.request("map_select_bg")
+backgrounds.request_thumbnails([f"map:{i}" for i in range(len(MAP_FILES))])
+
+def request_map(i):
+    backgrounds.request(f"map:{i}")
+
+def current_map_image():
+    return backgrounds.get(f"map:{selected_map}") if selected_map is not None else None
+
+# ================== Load character animations ==================
+# Sliced frames come from the on-disk atlas cache (sprites.py) when the sheet,
+# its SHEET_CFG_* and the scale match a previous run.
+SHEETS = {
+    "Naruto": (asset_path(SPRITESHEET_PATH_NARUTO), SHEET_CFG_NARUTO),
+    "Sasuke": (asset_path(SPRITESHEET_PATH_SASUKE), SHEET_CFG_SASUKE),
+}
+
+def apply_masks():
+    """Collision masks matching the hit box sizes now in use (a replay gets
+    whatever it was recorded with)."""
+    if playback is None:
+        pixel = PIXEL_COLLISION
+    else:
+        pixel = playback.meta.get("pixel_collision", False)
+    if pixel:
+        collision_masks.apply(match)
+    else:
+        for f in match.fighters:
+            f.set_frame_masks(None)
+        match.set_bullet_masks(None)
+
+def apply_character_scale(character):
+    """Frames for the current scale: cached, or scaled lazily as they are drawn."""
+    orig = loader.get(f"sheet:{character.skin}", {})
+    character.apply_scaled_animations(scale_cache.get(character.skin, runtime_scale, orig))
+    apply_masks()
+
+def on_sheet_ready(name, orig):
+    # The starting scale comes straight from the atlas cache; other scales are lazy.
+    path, cfg = SHEETS[name]
+    if orig:
+        scale_cache.put(name, runtime_scale, load_sheet_cached(path, cfg, runtime_scale, orig))
+        collision_masks.add(name, orig)
+    for c in match.fighters:
+        if c.skin == name:
+            apply_character_scale(c)
+
+for _name, (_path, _cfg) in SHEETS.items():
+    loader.request(f"sheet:{_name}",
+                   lambda path=_path, cfg=_cfg: load_sheet_cached(path, cfg, convert=False),
+                   convert_frames, priority=1,
+                   on_ready=lambda orig, name=_name: on_sheet_ready(name, orig))
+
+# ================== Load Fireball frames (original sizes) ==================
+def decode_fireballs():
+    """Every PNG in FIREBALL_DIR (Image0.png, Image1.png, ...) in numeric order,
+    decoded on a thread pool; convert_alpha still happens on the main thread."""
+    paths = asset_index.series(FIREBALL_DIR, ".png")
+    if not paths:
+        print("No fireball frames found in", FIREBALL_DIR)
+    frames = decode_all(paths, pygame.image.load)
+    if not frames:
+        print("⚠️ No fireball frames loaded! Shooting will fall back to simple drawing.")
+    return frames
+
+def apply_fireball_scale():
+    global fireball_frames
+    fireball_frames = scale_cache.get("fireballs", runtime_scale, {"fire": loader.get("fireballs", [])})["fire"]
+    match.set_bullet_sizes(fireball_frames.sizes)
+    apply_masks()
+
+def on_fireballs_ready(frames):
+    if frames:
+        collision_masks.add("fireballs", {"fire": frames})
+    apply_fireball_scale()
+
+loader.request("fireballs", decode_fireballs, lambda frames: [f.convert_alpha() for f in frames],
+               priority=2, on_ready=on_fireballs_ready)
+
+# runtime scale and scaled assets (filled in as the loader finishes)
+runtime_scale = float(INITIAL_SCALE)
+fireball_frames = []
+
+def match_assets():
+    """Loader names the selected match cannot start without."""
+    names = ["sheet:Naruto", "sheet:Sasuke", "fireballs"]
+    if selected_map is not None:
+        names.append(f"map:{selected_map}")
+    return names
+
+# ================== Bullets ==================
+def draw_bullets(surface, pool, alpha=1.0):
+    """Draw every live bullet ``alpha`` of the way into the last step; returns the touched rects."""
+    rects = []
+    n = pool.n
+    for x, y, vx, idx in zip(pool.lerp_x(alpha).tolist(), pool.y[:n].tolist(),
+                             pool.vx[:n].tolist(), pool.frame_idx[:n].tolist()):
+        if fireball_frames:
+            # mirrored frames when moving left
+            frames = fireball_frames.facing(vx >= 0)
+            fr = frames[idx % len(frames)]
+            r = fr.get_rect(center=(int(x), int(y)))
+            rects.append(surface.blit(fr, r.topleft))
+        else:
+            # fallback simple visual
+            rects.append(pygame.draw.circle(surface, (255, 140, 0), (int(x), int(y)), 8))
+            pygame.draw.circle(surface, BLACK, (int(x), int(y)), 8, 1)
+    return rects
+
+def frame_sizes(anims):
+    return {k: list(frames.sizes) for k, frames in (anims or {}).items()}
+
+# ================== Character ==================
+def _pressed(keys, key_or_keys):
+    if isinstance(key_or_keys, (list, tuple)):
+        return any(keys[k] for k in key_or_keys)
+    return keys[key_or_keys]
+
+class Character(Fighter):
+    """A simulated Fighter plus its keyboard map (or CPU bot) and sprites."""
+    def __init__(self, x, ground_y, name, controls, sprites=None, facing_right=True, team=None, skin=None,
+                 bot=None):
+        self.controls = controls
+        self.bot = bot
+        self.base_anims = sprites or {}
+        self.animations = sprites or {}
+        super().__init__(x, ground_y, name, frame_sizes(self.animations), facing_right, team, skin)
+
+    @property
+    def rect(self):
+        return pygame.Rect(self.rx, self.ry, self.rw, self.rh)
+
+    def current_frame(self):
+        """Current frame, already mirrored when facing left."""
+        ref = self.frame_ref()
+        if ref is None:
+            return None
+        # only ever local frames: a replay's sizes may not match these sheets
+        return local_frame(self.animations, ref[0], ref[1], self.facing_right, ANIM_NAMES)
+
+    def apply_scaled_animations(self, scaled):
+        self.animations = scaled or {}
+        self.set_frame_sizes(frame_sizes(self.animations))
+
+    def read_input(self, keys, state):
+        """Bitmask of the simulation.IN_* buttons held on this fighter's controls,
+        or pressed by its bot looking at ``state``; nothing once knocked out."""
+        if self.health <= 0:
+            return 0
+        if self.bot is not None:
+            return self.bot.act(state)
+        if self.controls is None:
+            return 0
+        buttons = 0
+        try:
+            for action, bit in INPUT_BITS.items():
+                if _pressed(keys, self.controls[action]):
+                    buttons |= bit
+        except Exception:
+            pass
+        return buttons
+
+    def draw(self, surface, alpha=1.0):
+        if self.health <= 0:
+            return None  # knocked out: off the floor
+        fr = self.current_frame()
+        midbottom = self.lerp_midbottom(alpha)
+        if fr:
+            r = fr.get_rect()
+            r.midbottom = midbottom
+            return surface.blit(fr, r.topleft)
+        else:
+            color = (255,165,0) if self.skin == "Naruto" else (0,0,255)
+            r = self.rect
+            r.midbottom = midbottom
+            return pygame.draw.rect(surface, color, r)
+
+    def get_attack_rect(self):
+        return pygame.Rect(self.attack_box())
+
+# ================== UI helpers ==================
+def draw_health_bar(x, y, health):
+    r = pygame.draw.rect(screen, RED, (x, y, 100, 10))
+    pygame.draw.rect(screen, GREEN, (x, y, max(0, int(health)), 10))
+    return r
+
+leaderboard = deque(maxlen=5)  # newest first
+def update_leaderboard(winner_name):
+    leaderboard.appendleft({"name": winner_name, "time": pygame.time.get_ticks() // 1000})
+
+def draw_leaderboard():
+    screen.blit(text("Leaderboard", 32, WHITE), (SCREEN_WIDTH//2 - 100, 50))
+    for i, entry in enumerate(leaderboard):
+        label = text(f"{i+1}. {entry['name']} - {entry['time']}s", 32, WHITE)
+        screen.blit(label, (SCREEN_WIDTH//2 - 100, 100 + i*28))
+
+# ================== Menu System ==================
+class Button:
+    def __init__(self, text, x, y, w, h, callback, font_size=36):
+        self.text = text
+        self.rect = pygame.Rect(x, y, w, h)
+        self.callback = callback
+        self.font_size = font_size
+
+    def draw(self, surface, hover=False):
+        color = (200,200,200) if hover else (255,255,255)
+        pygame.draw.rect(surface, (50,50,50), self.rect, border_radius=12)
+        pygame.draw.rect(surface, color, self.rect, 2, border_radius=12)
+        label = text(self.text, self.font_size, color)
+        surface.blit(label, (self.rect.centerx - label.get_width()//2,
+                             self.rect.centery - label.get_height()//2))
+
+    def check_click(self, pos):
+        if self.rect.collidepoint(pos):
+            try:
+                self.callback()
+            except Exception as e:
+                print("Button callback error:", e)
+
+def set_state(state):
+    global game_state
+    game_state = state
+
+def start_game(): set_state("map_selection")
+def show_controls(): set_state("controls")
+def resume_game(): set_state("playing")
+def quit_game():
+    try:
+        pygame.quit()
+    finally:
+        sys.exit(0)
+
+# Map selection helpers (images: MAP_FILES)
+maps = ["Forest", "Village", "Arena"]
+selected_map = None
+
+def map_item_rect(i):
+    return pygame.Rect(SCREEN_WIDTH//2 - 120, 140 + i*90, 240, 64)
+
+# Buttons
+start_buttons = [
+    Button("Start", SCREEN_WIDTH//2 - 100, 250, 200, 60, start_game),
+    Button("Controls", SCREEN_WIDTH//2 - 100, 350, 200, 60, show_controls),
+    Button("Quit", SCREEN_WIDTH//2 - 100, 450, 200, 60, quit_game),
+]
+back_btn = Button("Back", SCREEN_WIDTH//2 - 60, SCREEN_HEIGHT - 100, 120, 50, lambda: set_state("start_menu"))
+pause_buttons = [
+    Button("Resume", SCREEN_WIDTH//2 - 100, 250, 200, 60, resume_game),
+    Button("Back to Menu", SCREEN_WIDTH//2 - 100, 350, 200, 60, lambda: abandon_match()),
+]
+
+# Screens
+def draw_start_menu():
+    screen.fill(BLACK)
+    title = text("Naruto vs Sasuke", 64, WHITE)
+    screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 90))
+    for btn in start_buttons:
+        hover = btn.rect.collidepoint(mouse_pos())
+        btn.draw(screen, hover)
+
+def draw_controls_screen():
+    screen.fill(BLACK)
+    lines = [
+        "Controls:",
+        "Naruto: Arrows, melee=Down, SHOOT=Right Ctrl",
+        "Sasuke: WASD, melee=S, SHOOT=Left Ctrl",
+        "+/- resize, P to pause, R to restart after KO",
+        "Select map with mouse.",
+    ]
+    for i, line in enumerate(lines):
+        screen.blit(text(line, 32, WHITE), (50, 120 + i*40))
+    hover = back_btn.rect.collidepoint(mouse_pos())
+    back_btn.draw(screen, hover)
+
+def draw_map_selection():
+    map_select_bg = backgrounds.get("map_select_bg")
+    if map_select_bg:
+        screen.blit(map_select_bg, (0, 0))
+    else:
+        backgrounds.request("map_select_bg")  # dropped during a match
+        screen.fill(BLACK)
+
+    title = text("Select a Map", 36, WHITE)
+    screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 40))
+
+    for i, m in enumerate(maps):
+        rect = map_item_rect(i)
+        color = GREEN if selected_map == i else WHITE
+        pygame.draw.rect(screen, (50, 50, 50), rect, border_radius=12)
+        thumb_rect = pygame.Rect(rect.x + 12, rect.y + 4, *backgrounds.thumb_size)
+        thumb = backgrounds.thumbnail(f"map:{i}")
+        if thumb:
+            screen.blit(thumb, thumb_rect)
+        else:
+            pygame.draw.rect(screen, map_colors[i], thumb_rect)
+        pygame.draw.rect(screen, color, rect, 2, border_radius=12)
+        label = text(m, 36, color)
+        screen.blit(label, (thumb_rect.right + (rect.right - thumb_rect.right)//2 - label.get_width()//2,
+                            rect.centery - label.get_height()//2))
+
+    hint = text("Click a map to start playing", 36, WHITE)
+    screen.blit(hint, (SCREEN_WIDTH//2 - hint.get_width()//2, SCREEN_HEIGHT - 60))
+    
+    # Draw Back button
+    hover = back_btn.rect.collidepoint(mouse_pos())
+    back_btn.draw(screen, hover)
+
+def draw_loading_screen(progress):
+    screen.fill(BLACK)
+    title = text("Loading...", 48, WHITE)
+    screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, SCREEN_HEIGHT//2 - 80))
+    bar = pygame.Rect(SCREEN_WIDTH//2 - 200, SCREEN_HEIGHT//2, 400, 24)
+    pygame.draw.rect(screen, (50,50,50), bar, border_radius=8)
+    pygame.draw.rect(screen, GREEN, (bar.x, bar.y, int(bar.width * progress), bar.height), border_radius=8)
+    pygame.draw.rect(screen, WHITE, bar, 2, border_radius=8)
+
+def draw_pause_menu():
+    """Frozen match, overlay and title (composed once per pause), then the buttons."""
+    def compose():
+        draw_match_scene()
+        screen.blit(overlay((SCREEN_WIDTH, SCREEN_HEIGHT), (0,0,0,180)), (0,0))
+        title = text("Paused", 48, WHITE)
+        screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 150))
+    backdrop.draw(("paused", match.frame, runtime_scale), compose)
+    for btn in pause_buttons:
+        hover = btn.rect.collidepoint(mouse_pos())
+        btn.draw(screen, hover)
+
+# ================== Instantiate Characters ==================
+KEYBOARD_CONTROLS = [
+    {"left": pygame.K_LEFT, "right": pygame.K_RIGHT, "jump": pygame.K_UP,
+     "attack": pygame.K_DOWN, "shoot": pygame.K_RCTRL},
+    {"left": pygame.K_a, "right": pygame.K_d, "jump": pygame.K_w,
+     "attack": pygame.K_s, "shoot": pygame.K_LCTRL},
+]
+
+match = MatchState([])
+
+def setup_fighters(roster):
+    """Replace the match's fighters with Characters for ``roster`` (see
+    simulation.party_roster), sprites and masks included. Fighters past the
+    keyboard maps, and those in CPU_PLAYERS, get a CpuBot (not in replays)."""
+    cpu = [i for i in range(len(roster)) if i >= len(KEYBOARD_CONTROLS) or i + 1 in CPU_PLAYERS]
+    fighters = []
+    for i, r in enumerate(roster):
+        bot = None
+        if i in cpu and playback is None:
+            bot = CpuBot.level(i, None, CPU_LEVEL, share=len(cpu))
+        fighters.append(Character(r["x"], GROUND_Y, r["name"], None if i in cpu else KEYBOARD_CONTROLS[i],
+                                  facing_right=r["facing_right"], team=r.get("team"), skin=r.get("skin"),
+                                  bot=bot))
+    match.fighters = fighters
+    match.update_teams()
+    for c in match.fighters:
+        apply_character_scale(c)
+
+# ================== Game Loop ==================
+clock = pygame.time.Clock()
+timestep = FixedTimestep(SIM_HZ, MAX_CATCHUP_STEPS)
+game_over = False
+game_state = "start_menu"  # first screen
+running = True
+winner = ""
+
+print("Controls:")
+print("  Naruto: Arrows, melee=Down, SHOOT=Right Ctrl")
+print("  Sasuke: WASD, melee=S, SHOOT=Left Ctrl")
+print("  Flow: Start Menu -> Map Selection (mouse) -> Play. +/- to resize, P to pause, R to restart after KO.")
+
+def rescale_both():
+    for c in match.fighters:
+        apply_character_scale(c)
+    apply_fireball_scale()
+
+MATCH_SOUNDS = {"attack": attack_sound, "shoot": shoot_sound, "hit": hit_sound}
+
+heard_swings = {}  # (attacker, target) -> the melee swing last heard hitting
+
+def play_match_sounds(events):
+    for ev in events:
+        snd = MATCH_SOUNDS.get(ev[0])
+        if snd is None:
+            continue
+        if ev[0] == "hit" and ev[5] is not None:
+            if heard_swings.get(ev[1:3]) == ev[5]:
+                continue  # the same swing, still touching
+            heard_swings[ev[1:3]] = ev[5]
+        voices.play(ev[0], snd)
+
+dirty = DirtyRectRenderer(screen, display)
+backdrop = Backdrop(screen)
+prof = FrameProfiler(trace_path=PROFILE_TRACE_PATH)
+prof.show_overlay = PROFILE_OVERLAY
+
+recorder = None  # ReplayRecorder of the match being played
+playback = None  # Replay being watched instead of keyboard input
+netplay = None   # RollbackSession of an online match
+
+setup_fighters(party_roster(PARTY_SIZE, PARTY_TEAMS))
+
+def scale_locked():
+    """Replays and online matches need the hit box sizes they started with."""
+    return playback is not None or netplay is not None
+
+telemetry = None
+if TELEMETRY:
+    try:
+        telemetry = Telemetry(TELEMETRY_DIR, TELEMETRY_FORMAT)
+    except ValueError as e:
+        print("Telemetry off:", e)
+match_started = 0.0
+match_frame_ms = []  # drawn frames of the current match, for its match_end record
+
+def logging_match():
+    return telemetry is not None and playback is None
+
+def log_match_start():
+    global match_started
+    match_started = perf_counter()
+    match_frame_ms.clear()
+    if logging_match():
+        telemetry.record("match_start", map=selected_map, scale=runtime_scale,
+                         online=netplay is not None,
+                         fighters=[{"name": f.name, "skin": f.skin, "team": f.team} for f in match.fighters])
+
+def log_match_events(events, frame):
+    if not logging_match():
+        return
+    for ev in events:
+        if ev[0] == "hit":
+            telemetry.record("hit", frame=frame, attacker=ev[1], target=ev[2], damage=ev[3], via=ev[4])
+        elif ev[0] in ("attack", "shoot"):
+            telemetry.record(ev[0], frame=frame, fighter=ev[1])
+
+def log_match_end(abandoned=False):
+    if not logging_match():
+        return
+    p50, p99 = percentiles(match_frame_ms)
+    telemetry.record("match_end", frames=match.frame, seconds=round(perf_counter() - match_started, 2),
+                     winner=None if abandoned else match.winner, abandoned=abandoned,
+                     health={f.name: f.health for f in match.fighters},
+                     frame_ms_p50=round(p50, 3), frame_ms_p99=round(p99, 3))
+
+def start_recording():
+    global recorder
+    if RECORD_REPLAYS and playback is None and netplay is None:
+        recorder = ReplayRecorder(match, {"map": selected_map, "scale": runtime_scale,
+                                          "pixel_collision": PIXEL_COLLISION})
+
+def save_recording():
+    global recorder
+    if recorder is None or match.frame == 0:
+        recorder = None
+        return
+    recorder.finish(match)
+    path = os.path.join(REPLAY_DIR, strftime("%Y%m%d-%H%M%S") + ".nvsr")
+    try:
+        recorder.save(path)
+        print("Saved replay:", path)
+    except Exception as e:
+        print("Failed to save replay", path, e)
+    recorder = None
+
+def start_playback(path):
+    """Watch the replay at ``path``: same map and scale, inputs from the file."""
+    global playback, selected_map, runtime_scale, game_state
+    try:
+        playback = load_replay(path)
+    except Exception as e:
+        print("Failed to load replay", path, e)
+        return
+    print(f"Playing replay: {path} ({len(playback)} frames)")
+    setup_fighters(playback.roster)
+    selected_map = playback.meta.get("map")
+    runtime_scale = playback.meta.get("scale", runtime_scale)
+    rescale_both()
+    if selected_map is not None:
+        request_map(selected_map)
+    game_state = "loading"
+
+def start_netplay(spec):
+    """Play the fighter ``side`` of NVS_NETPLAY against a peer on NET_MAP."""
+    global netplay, selected_map, game_state
+    try:
+        side, local, remote = spec.split(",")
+        side = int(side)
+        transport = UdpTransport(parse_addr(local), parse_addr(remote, "127.0.0.1"),
+                                 NET_DELAY_MS, loss=NET_LOSS)
+    except Exception as e:
+        print("Bad NVS_NETPLAY", repr(spec), e)
+        return
+    setup_fighters(party_roster(2))
+    netplay = RollbackSession(match, side, transport, NET_INPUT_DELAY, NET_MAX_ROLLBACK)
+    print(f"Online as {match.fighters[side].name}, peer {transport.remote[0]}:{transport.remote[1]}")
+    selected_map = NET_MAP
+    request_map(selected_map)
+    game_state = "loading"
+
+def reset_match():
+    """Fresh fighters and an empty arena; the next match starts from map selection."""
+    global playback, game_over, selected_map, winner
+    playback = None
+    setup_fighters(party_roster(PARTY_SIZE, PARTY_TEAMS))
+    match.bullets.clear()
+    match.frame = 0
+    game_over = match.game_over = False
+    match.winner = ""
+    selected_map = None
+    winner = ""
+
+def abandon_match():
+    """Leave a paused match for the menu: its replay and telemetry end here,
+    so the next Start begins a new match instead of resuming this one."""
+    save_recording()
+    if match.frame:
+        log_match_end(abandoned=True)
+    reset_match()
+    set_state("start_menu")
+
+def run_steps(n, inputs):
+    """Run ``n`` simulation steps; returns True once the match is over."""
+    global winner, game_over, runtime_scale
+    for _ in range(n):
+        if netplay is not None:
+            # steps with the peer's predicted input, re-simulating from a
+            # snapshot first if an earlier prediction turned out wrong
+            if not netplay.advance(inputs[netplay.local]):
+                break
+        else:
+            if playback is not None:
+                if match.frame >= len(playback):
+                    break
+                entry = playback.resize_at(match.frame)
+                if entry is not None and entry.get("scale", runtime_scale) != runtime_scale:
+                    runtime_scale = entry["scale"]
+                    rescale_both()
+                # hit boxes exactly as recorded, whatever the sprites on this machine
+                if playback.apply_sizes(match, match.frame) is not None:
+                    apply_masks()
+                inputs = playback.inputs_at(match.frame)
+            elif recorder is not None:
+                recorder.record(match, inputs)
+            step(match, inputs, prof.mark)
+        if n <= MAX_CATCHUP_STEPS:
+            play_match_sounds(match.events)
+        if netplay is None:
+            log_match_events(match.events, match.frame)
+        else:
+            # only what survived every rollback; predicted hits may never happen
+            for frame, events in netplay.take_settled_events():
+                log_match_events(events, frame + 1)
+
+        # online, a KO only counts once the peer's inputs up to it are in
+        if match.game_over and (netplay is None or netplay.settled()):
+            winner = match.winner
+            update_leaderboard(winner)
+            game_over = True
+            save_recording()
+            log_match_end()
+            return True
+    return False
+
+def draw_match_scene(dirty_frame=False, alpha=1.0):
+    """Map, fighters, bullets and health bars (only last frame's sprite areas
+    are restored from the map in dirty-rect mode); moving things are drawn
+    ``alpha`` of the way from the previous simulation step to the last one."""
+    background = dirty.background_for(current_map_image(),
+                                      map_colors[selected_map] if selected_map is not None else WHITE)
+    if dirty_frame:
+        dirty.begin(background)
+    else:
+        screen.blit(background, (0, 0))
+    prof.mark("background")
+
+    # Draw players
+    for c in match.fighters:
+        dirty.add(c.draw(screen, alpha))
+    prof.mark("draw_fighters")
+
+    # Draw bullets
+    dirty.add(draw_bullets(screen, match.bullets, alpha))
+    prof.mark("draw_bullets")
+
+    # UI: even fighters' bars down the left, odd ones down the right
+    for i, c in enumerate(match.fighters):
+        x = 50 if i % 2 == 0 else SCREEN_WIDTH - 150
+        dirty.add(draw_health_bar(x, 20 + 16 * (i // 2), c.health))
+
+def draw_game_over_screen():
+    """Final match frame under the result, composed once per KO."""
+    def compose():
+        draw_match_scene()
+        draw_game_over()
+    backdrop.draw(("game_over", match.frame, runtime_scale, winner), compose)
+
+def screen_view():
+    """What a static screen shows right now, or None while something moves.
+
+    The loop only redraws when this changes and otherwise waits for input.
+    """
+    if prof.show_overlay:
+        return None
+    mouse = mouse_pos()
+    def hover(buttons):
+        return tuple(btn.rect.collidepoint(mouse) for btn in buttons)
+    if game_state == "start_menu":
+        return ("start_menu", hover(start_buttons))
+    if game_state == "controls":
+        return ("controls", hover([back_btn]))
+    if game_state == "map_selection":
+        return ("map_selection", selected_map, backgrounds.ready("map_select_bg"),
+                tuple(backgrounds.thumbnail(f"map:{i}") is not None for i in range(len(maps))), hover([back_btn]))
+    if game_state == "paused":
+        return ("paused", match.frame, runtime_scale, hover(pause_buttons))
+    if game_state == "playing" and game_over:
+        return ("game_over", match.frame, runtime_scale, winner)
+    return None
+
+def idle_wait(timeout_ms):
+    """Block until an event arrives or ``timeout_ms`` pass; returns the event
+    (taken off the queue, so handle it before the rest) or None."""
+    event = pygame.event.wait(timeout_ms)
+    return event if event.type != pygame.NOEVENT else None
+
+def draw_game_over():
+    screen.blit(overlay((SCREEN_WIDTH, SCREEN_HEIGHT), (0,0,0,180)), (0,0))
+    winner_text = text(f"{winner} Wins! Press R to Restart", 48, WHITE)
+    screen.blit(winner_text, (SCREEN_WIDTH//2 - 240, SCREEN_HEIGHT//2 - 20))
+    draw_leaderboard()
+
+# Importing this module (e.g. from bench.py) sets up the window and assets
+# without entering the loop.
+if __name__ == "__main__":
+    start_time = time()
+    if REPLAY_PATH:
+        start_playback(REPLAY_PATH)
+    elif NETPLAY:
+        start_netplay(NETPLAY)
+    shown_view = None  # screen_view() of what is on the display now
+    woke = []          # the event that ended an idle wait, ahead of the queue
+    try:
+        while running:
+            dirty_frame = False
+            prof.begin_frame()
+            loader.pump()
+            prof.mark("loader")
+            events, woke = woke + pygame.event.get(), []
+            for event in events:
+                if event.type == pygame.QUIT:
+                    running = False
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    shown_view = None
+                if event.type == pygame.WINDOWSIZECHANGED and window is not None:
+                    window.resize()
+                    shown_view = None
+
+                # Mouse clicks for menus
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                    if game_state == "start_menu":
+                        for btn in start_buttons:
+                            btn.check_click(mouse_pos(event.pos))
+                    elif game_state == "controls":
+                        back_btn.check_click(mouse_pos(event.pos))
+                    elif game_state == "map_selection":
+                        # Choose a map by clicking; load it, then go to playing
+                        for i in range(len(maps)):
+                            if map_item_rect(i).collidepoint(mouse_pos(event.pos)):
+                                selected_map = i
+                                request_map(i)
+                                game_state = "loading"
+                        back_btn.check_click(mouse_pos(event.pos))
+                    elif game_state == "paused":
+                        for btn in pause_buttons:
+                            btn.check_click(mouse_pos(event.pos))
+
+                # Keys (resize, pause, restart and profiler overlay)
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_F3:
+                        prof.show_overlay = not prof.show_overlay
+                        dirty.invalidate()
+                    # Resize (not in replays or online)
+                    elif not scale_locked() and (event.key in (pygame.K_KP_PLUS,) or getattr(event, "unicode", "") == "+"):
+                        runtime_scale = min(4.0, round(INITIAL_SCALE if 'runtime_scale' not in globals() else runtime_scale + 0.1, 2))
+                        rescale_both()
+                        if recorder is not None:
+                            recorder.note_sizes(match, scale=runtime_scale)
+                        print(f"Scale -> {runtime_scale:.2f}")
+                    elif not scale_locked() and (event.key in (pygame.K_KP_MINUS,) or getattr(event, "unicode", "") == "-"):
+                        runtime_scale = max(0.5, round(INITIAL_SCALE if 'runtime_scale' not in globals() else runtime_scale - 0.1, 2))
+                        rescale_both()
+                        if recorder is not None:
+                            recorder.note_sizes(match, scale=runtime_scale)
+                        print(f"Scale -> {runtime_scale:.2f}")
+                    # Pause (an online match can't)
+                    elif event.key == pygame.K_p and game_state == "playing" and not game_over and netplay is None:
+                        game_state = "paused"
+                    elif event.key == pygame.K_p and game_state == "paused":
+                        game_state = "playing"
+                    # Restart after KO (online: restart both games instead)
+                    elif game_state == "playing" and game_over and event.key == pygame.K_r and netplay is None:
+                        reset_match()
+                        game_state = "map_selection"
+
+            prof.mark("events")
+
+            # Simulation time only runs during a live match
+            if game_state != "playing" or game_over:
+                timestep.reset()
+            if game_state == "playing" and game_over and netplay is not None:
+                netplay.poll()  # let the peer settle the KO too
+
+            # Nothing on screen would change: sleep instead of redrawing
+            view = screen_view()
+            if view is not None and view == shown_view:
+                event = idle_wait(IDLE_WAIT_MS)
+                if event is not None:
+                    woke.append(event)
+                prof.mark("idle")
+                prof.end_frame()
+                continue
+            shown_view = view
+
+            # ====== State-specific update & draw ======
+            if game_state == "start_menu":
+                draw_start_menu()
+
+            elif game_state == "controls":
+                draw_controls_screen()
+
+            elif game_state == "map_selection":
+                draw_map_selection()
+
+            elif game_state == "loading":
+                progress = loader.progress(match_assets())
+                if progress >= 1.0:
+                    game_state = "playing"
+                    backdrop.invalidate()  # its keys count frames, which start over each match
+                    heard_swings.clear()   # and so do swings
+                    start_recording()
+                    log_match_start()
+                draw_loading_screen(progress)
+
+            elif game_state == "paused":
+                draw_pause_menu()
+
+            elif game_state == "playing":
+                if not game_over:
+                    keys = pygame.key.get_pressed()
+                    inputs = [c.read_input(keys, match) for c in match.fighters]
+                    prof.mark("input")
+
+                    # Move, melee, bullets and KO all happen in the simulation
+                    # step, run as many times as SIM_HZ says is due (more when
+                    # fast-forwarding a replay; only the last one gets drawn)
+                    n = timestep.advance(perf_counter())
+                    if playback is not None and keys[pygame.K_TAB]:
+                        n *= REPLAY_FAST_FORWARD
+                    run_steps(n, inputs)
+                    prof.mark("ko_sounds")
+
+                if game_over:
+                    draw_game_over_screen()
+                else:
+                    dirty_frame = DIRTY_RECTS
+                    draw_match_scene(dirty_frame, timestep.alpha)
+            prof.mark("hud" if game_state == "playing" else "menu")
+
+            dirty.add(prof.draw(screen))
+            prof.mark("overlay")
+            if dirty_frame:
+                dirty.present()
+            else:
+                dirty.invalidate()
+                display.flip()
+            prof.mark("flip")
+            clock.tick(RENDER_FPS)
+            prof.mark("tick")
+            frame_ms = prof.end_frame()
+            if game_state == "playing" and not game_over:
+                match_frame_ms.append(frame_ms)
+
+    finally:
+        elapsed = time() - start_time
+        print(f"Exiting after {elapsed:.2f} sec")
+        if not game_over:
+            save_recording()
+            if game_state in ("playing", "paused") and match.frame:
+                log_match_end(abandoned=True)
+        if telemetry is not None:
+            telemetry.close()
+        if netplay is not None:
+            netplay.transport.close()
+        prof.dump()
+        try: pygame.quit()
+        except Exception: pass
+        sys.exit(0)
\ No newline at end of file
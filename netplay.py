@@ -0,0 +1,281 @@
+"""Rollback netplay over UDP for two machines.
+
+Each side runs the whole match. Its own input is applied ``input_delay``
+frames late; the peer's input is predicted (the last one it sent) so the
+match never waits for the network. When the real input for an
+already-simulated frame arrives and differs from the prediction, the match
+is restored from the snapshot taken before that frame and re-simulated up
+to the present, all within one step. Only if the peer falls more than
+``max_rollback`` frames behind does a side stop stepping until it catches
+up.
+
+Every packet repeats all inputs the peer hasn't acknowledged yet, so lost
+packets are covered by the next one. ``UdpTransport`` can add delay,
+jitter and loss for testing on one machine:
+
+    python netplay.py --delay 50 --loss 0.1   # two peers over loopback
+"""
+import argparse
+import heapq
+import random
+import socket
+import struct
+import sys
+import threading
+from time import perf_counter, sleep
+
+from simulation import new_match, random_inputs, snapshot_checksum, step
+
+NET_MAGIC = b"NVS1"
+# magic, ack (first frame still missing from the peer), first frame, input count
+PACKET = struct.Struct("<4sIIB")
+MAX_INPUTS_PER_PACKET = 255
+
+def parse_addr(text, default_host="0.0.0.0"):
+    """"host:port" or "port" -> (host, port)."""
+    host, _, port = text.rpartition(":")
+    return (host or default_host, int(port))
+
+class UdpTransport:
+    """Non-blocking UDP socket to one peer, with optional fake delay, jitter and loss."""
+    def __init__(self, local, remote, delay_ms=0.0, jitter_ms=0.0, loss=0.0, seed=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(local)
+        self.sock.setblocking(False)
+        self.remote = remote
+        self.delay = delay_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.loss = loss
+        self._rng = random.Random(seed)
+        self._outbox = []  # heap of (due time, seq, packet) while faking delay
+        self._seq = 0
+
+    def send(self, data):
+        if self.loss and self._rng.random() < self.loss:
+            return
+        if self.delay or self.jitter:
+            due = perf_counter() + self.delay + self._rng.uniform(0.0, self.jitter)
+            heapq.heappush(self._outbox, (due, self._seq, data))
+            self._seq += 1
+        else:
+            self._sendto(data)
+
+    def _sendto(self, data):
+        try:
+            self.sock.sendto(data, self.remote)
+        except OSError:
+            pass  # peer not up yet (ICMP refused) or buffer full: the next packet repeats it
+
+    def receive(self):
+        """Send whatever fake delay has released, then return every packet waiting."""
+        now = perf_counter()
+        while self._outbox and self._outbox[0][0] <= now:
+            self._sendto(heapq.heappop(self._outbox)[2])
+        packets = []
+        while True:
+            try:
+                data, _ = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return packets
+            except OSError:
+                continue
+            packets.append(data)
+
+    def close(self):
+        self.sock.close()
+
+class RollbackSession:
+    """Drives a two-fighter MatchState for the fighter at ``local_index``.
+
+    Call ``advance(buttons)`` once per simulation tick with the local IN_*
+    bitmask; it returns False when it had to wait for the peer. The match is
+    final up to ``settled()``; a KO only counts once it is settled.
+    """
+    def __init__(self, state, local_index, transport, input_delay=2, max_rollback=8, check_sync=False):
+        self.state = state
+        self.local = local_index
+        self.remote = 1 - local_index
+        self.transport = transport
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        self.local_inputs = {f: 0 for f in range(state.frame, state.frame + input_delay)}
+        self.local_last = state.frame + input_delay - 1
+        self.remote_inputs = {}
+        self.used = {}        # frame -> remote input the match was stepped with
+        self.snapshots = {}   # frame -> state snapshot taken before stepping it
+        self.events = {}      # frame -> events of its latest simulation, until taken
+        self.remote_next = state.frame  # first frame whose remote input hasn't arrived
+        self.peer_ack = state.frame     # first local frame the peer hasn't confirmed
+        self.checksums = {} if check_sync else None  # frame -> CRC of the settled state
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.stalls = 0
+
+    def settled(self):
+        """True when every frame simulated so far used the peer's real input."""
+        return self.remote_next >= self.state.frame
+
+    def take_settled_events(self):
+        """(frame, events) for each frame that can no longer be rolled back and
+        hasn't been taken yet, oldest first; the events are the ones of the
+        timeline that stands, not of a misprediction."""
+        done = min(self.remote_next, self.state.frame)
+        return [(f, self.events.pop(f)) for f in sorted(f for f in self.events if f < done)]
+
+    def advance(self, buttons):
+        frame = self.state.frame
+        if frame + self.input_delay > self.local_last:
+            self.local_last = frame + self.input_delay
+            self.local_inputs[self.local_last] = buttons
+        self.poll()
+        if frame - self.remote_next >= self.max_rollback:
+            self.stalls += 1
+            return False
+        self.snapshots[frame] = self.state.snapshot()
+        self._step(frame)
+        return True
+
+    def poll(self):
+        """Exchange inputs (rolling back if needed) without stepping; call it
+        while the game-over screen is up so the peer can settle too."""
+        self._receive()
+        self._send()
+
+    def _predict(self, frame):
+        bits = self.remote_inputs.get(frame)
+        if bits is None:
+            bits = self.remote_inputs.get(self.remote_next - 1, 0)
+        return bits
+
+    def _step(self, frame):
+        remote = self._predict(frame)
+        self.used[frame] = remote
+        inputs = [0, 0]
+        inputs[self.local] = self.local_inputs[frame]
+        inputs[self.remote] = remote
+        step(self.state, inputs)
+        self.events[frame] = list(self.state.events)
+
+    def _send(self):
+        first = self.peer_ack
+        last = min(self.local_last, first + MAX_INPUTS_PER_PACKET - 1)
+        bits = bytes(self.local_inputs[f] for f in range(first, last + 1))
+        self.transport.send(PACKET.pack(NET_MAGIC, self.remote_next, first, len(bits)) + bits)
+
+    def _receive(self):
+        rollback_to = None
+        for data in self.transport.receive():
+            if len(data) < PACKET.size:
+                continue
+            magic, ack, first, count = PACKET.unpack_from(data)
+            if magic != NET_MAGIC or len(data) != PACKET.size + count:
+                continue
+            self.peer_ack = max(self.peer_ack, ack)
+            for f, bits in enumerate(data[PACKET.size:], first):
+                if f < self.remote_next or f in self.remote_inputs:
+                    continue
+                self.remote_inputs[f] = bits
+                used = self.used.get(f)
+                if used is not None and used != bits and (rollback_to is None or f < rollback_to):
+                    rollback_to = f
+        while self.remote_next in self.remote_inputs:
+            self.remote_next += 1
+        if rollback_to is not None:
+            self._rollback(rollback_to)
+        self._prune()
+
+    def _rollback(self, frame):
+        state = self.state
+        end = state.frame
+        state.restore(self.snapshots[frame])
+        for f in range(frame, end):
+            if f > frame:
+                self.snapshots[f] = state.snapshot()
+            self._step(f)
+        state.events.clear()  # already heard the first time round
+        self.rollbacks += 1
+        self.resimulated += end - frame
+
+    def _prune(self):
+        """Drop what no rollback or future step can need: frames that are both
+        simulated and confirmed (the peer may be ahead of us, or behind)."""
+        done = min(self.remote_next, self.state.frame)
+        for f in [f for f in self.snapshots if f < done]:
+            snap = self.snapshots.pop(f)
+            if self.checksums is not None:
+                self.checksums[f] = snapshot_checksum(snap)
+        for f in [f for f in self.used if f < done]:
+            del self.used[f]
+        # keep the last confirmed remote input: it is the prediction
+        for f in [f for f in self.remote_inputs if f < done and f < self.remote_next - 1]:
+            del self.remote_inputs[f]
+        # our own inputs once the peer has them too
+        for f in [f for f in self.local_inputs if f < min(done, self.peer_ack)]:
+            del self.local_inputs[f]
+
+# ================== Loopback test ==================
+def held_inputs(rng, frames, n=2, hold=(4, 30)):
+    """Random button states held for a few frames each, like a player would."""
+    out, cur, left = [], [0] * n, [0] * n
+    for _ in range(frames):
+        for i in range(n):
+            if left[i] == 0:
+                cur[i], left[i] = random_inputs(rng, 1)[0], rng.randint(*hold)
+            left[i] -= 1
+        out.append(tuple(cur))
+    return out
+
+def run_loopback(frames=600, delay_ms=50.0, jitter_ms=10.0, loss=0.05, hz=60, seed=0, port=47600):
+    """Two peers over loopback, each on its own thread at ``hz``; returns both sessions."""
+    rng = random.Random(seed)
+    script = held_inputs(rng, frames)
+    addrs = [("127.0.0.1", port), ("127.0.0.1", port + 1)]
+    sessions = []
+    for side in (0, 1):
+        t = UdpTransport(addrs[side], addrs[1 - side], delay_ms, jitter_ms, loss, seed=seed + side)
+        sessions.append(RollbackSession(new_match(), side, t, check_sync=True))
+
+    def run(s):
+        dt = 1.0 / hz
+        nxt = perf_counter()
+        while s.state.frame < frames and not (s.state.game_over and s.settled()):
+            s.advance(script[s.state.frame][s.local])
+            nxt += dt
+            sleep(max(0.0, nxt - perf_counter()))
+        # keep answering until the peer has everything (or give up after a second)
+        deadline = perf_counter() + 1.0
+        while perf_counter() < deadline and not s.settled():
+            s.poll()
+            sleep(dt)
+        for _ in range(10):
+            s.poll()
+            sleep(dt)
+
+    threads = [threading.Thread(target=run, args=(s,)) for s in sessions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for s in sessions:
+        s.poll()
+        s.transport.close()
+    return sessions
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Rollback netplay loopback test")
+    ap.add_argument("--frames", type=int, default=600)
+    ap.add_argument("--delay", type=float, default=50.0, help="one-way delay in ms")
+    ap.add_argument("--jitter", type=float, default=10.0, help="extra random delay in ms")
+    ap.add_argument("--loss", type=float, default=0.05, help="packet loss fraction")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    a, b = run_loopback(args.frames, args.delay, args.jitter, args.loss, seed=args.seed)
+    common = sorted(set(a.checksums) & set(b.checksums))
+    bad = [f for f in common if a.checksums[f] != b.checksums[f]]
+    for s in (a, b):
+        print(f"side {s.local}: frame {s.state.frame}, rollbacks {s.rollbacks} "
+              f"({s.resimulated} frames re-simulated), stalls {s.stalls}, "
+              f"winner {s.state.winner or '-'}")
+    print(f"{len(common)} settled frames compared, {len(bad)} desynced"
+          + (f" (first at {bad[0]})" if bad else ""))
+    sys.exit(1 if bad or not common else 0)
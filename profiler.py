@@ -0,0 +1,103 @@
+"""Per-phase frame timing for the main loop.
+
+The loop calls ``begin_frame()``, then ``mark(phase)`` after each phase (the
+time since the previous mark is charged to that phase), then ``end_frame()``.
+A rolling window feeds the on-screen overlay (p50/p99 frame time and the
+slowest phases); with a trace path every frame is also kept and written out
+as CSV or JSON by ``dump()``.
+"""
+import csv
+import json
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+from render import text
+
+def percentiles(totals):
+    """(p50, p99) of the frame times ``totals`` in ms; zeros when empty."""
+    if not totals:
+        return 0.0, 0.0
+    p50, p99 = np.percentile(np.fromiter(totals, np.float64, len(totals)), [50, 99])
+    return float(p50), float(p99)
+
+class FrameProfiler:
+    def __init__(self, window=300, trace_path=None, max_trace_frames=216000):
+        self.window = deque(maxlen=window)        # (total_ms, {phase: ms}) per frame
+        self.trace_path = trace_path
+        self.trace = deque(maxlen=max_trace_frames) if trace_path else None
+        self.phases = []                          # phase names in first-seen order
+        self.frame_no = 0
+        self.show_overlay = False
+        self._t0 = self._last = perf_counter()
+        self._cur = {}
+        self._lines = []
+        self._lines_at = -1
+
+    def begin_frame(self):
+        self._t0 = self._last = perf_counter()
+        self._cur = {}
+
+    def mark(self, phase):
+        now = perf_counter()
+        cur = self._cur
+        cur[phase] = cur.get(phase, 0.0) + (now - self._last) * 1000.0
+        self._last = now
+
+    def end_frame(self):
+        """Close the frame; returns its total time in ms."""
+        total = (perf_counter() - self._t0) * 1000.0
+        for phase in self._cur:
+            if phase not in self.phases:
+                self.phases.append(phase)
+        self.window.append((total, self._cur))
+        if self.trace is not None:
+            self.trace.append((self.frame_no, total, self._cur))
+        self.frame_no += 1
+        return total
+
+    def percentiles(self):
+        """(p50, p99) frame time in ms over the rolling window."""
+        return percentiles([t for t, _ in self.window])
+
+    def summary_lines(self, top=6):
+        p50, p99 = self.percentiles()
+        lines = [f"frame p50 {p50:5.2f} ms  p99 {p99:5.2f} ms  ({len(self.window)} frames)"]
+        n = max(1, len(self.window))
+        means = {p: sum(ph.get(p, 0.0) for _, ph in self.window) / n for p in self.phases}
+        for phase, ms in sorted(means.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+            lines.append(f"{phase:<14} {ms:6.3f} ms")
+        return lines
+
+    def draw(self, surface, pos=(8, 40), refresh_every=30):
+        """Overlay text, recomputed every ``refresh_every`` frames; returns the touched rects."""
+        if not self.show_overlay:
+            return []
+        if self._lines_at < 0 or self.frame_no - self._lines_at >= refresh_every:
+            self._lines = [text(line, 20, (255, 255, 0)) for line in self.summary_lines()]
+            self._lines_at = self.frame_no
+        x, y = pos
+        rects = []
+        for label in self._lines:
+            rects.append(surface.blit(label, (x, y)))
+            y += label.get_height() + 2
+        return rects
+
+    def dump(self, path=None):
+        """Write the per-frame trace; ``.json`` paths get JSON, anything else CSV."""
+        path = path or self.trace_path
+        if not path or not self.trace:
+            return
+        if path.endswith(".json"):
+            rows = [{"frame": f, "total_ms": round(t, 4), **{p: round(ms, 4) for p, ms in ph.items()}}
+                    for f, t, ph in self.trace]
+            with open(path, "w") as fh:
+                json.dump({"phases": self.phases, "frames": rows}, fh)
+        else:
+            with open(path, "w", newline="") as fh:
+                w = csv.writer(fh)
+                w.writerow(["frame", "total_ms"] + self.phases)
+                for f, t, ph in self.trace:
+                    w.writerow([f, f"{t:.4f}"] + [f"{ph.get(p, 0.0):.4f}" for p in self.phases])
+        print(f"Wrote {len(self.trace)} frame timings to {path}")
@@ -0,0 +1,167 @@
+"""Rendering helpers: cached text and overlays, and the dirty-rect renderer.
+
+Menus and the HUD ask for text through ``text()``, so a label is rendered
+once and then reused; fonts and translucent overlays are cached the same way.
+
+Instead of blitting the whole 800x600 background and flipping every frame,
+the dirty-rect renderer restores only the areas where something was drawn
+last frame, and pushes only those plus this frame's areas to the display.
+
+A ``Backdrop`` keeps a whole composed screen (say the frozen match under
+the pause menu) so it is blitted back instead of drawn again.
+
+``ScaledDisplay`` lets the game draw into a fixed-size buffer whatever the
+window size, and scales that buffer to the window in one pass per frame.
+"""
+from functools import lru_cache
+
+import pygame
+
+# ================== Text and overlay caches ==================
+@lru_cache(maxsize=None)
+def font(size):
+    return pygame.font.SysFont(None, size)
+
+@lru_cache(maxsize=512)
+def text(label, size, color):
+    """``label`` rendered antialiased at ``size`` in ``color``; reused, so don't draw on it."""
+    return font(size).render(label, True, color)
+
+@lru_cache(maxsize=8)
+def overlay(size, rgba):
+    surf = pygame.Surface(size, pygame.SRCALPHA)
+    surf.fill(rgba)
+    return surf
+
+# ================== Dirty rectangles ==================
+class DirtyRectRenderer:
+    """``display`` is what frames are pushed through: pygame.display or a ScaledDisplay."""
+    def __init__(self, screen, display=pygame.display):
+        self.screen = screen
+        self.display = display
+        self._background = None
+        self._prev = []
+        self._cur = []
+        self._full = True
+        self._fills = {}
+
+    def invalidate(self):
+        """Something else drew over the screen; the next frame redraws it fully."""
+        self._full = True
+        self._cur = []
+
+    def background_for(self, image, color):
+        """``image`` if there is one, else a cached full-screen surface of ``color``."""
+        if image is not None:
+            return image
+        surf = self._fills.get(color)
+        if surf is None:
+            surf = pygame.Surface(self.screen.get_size()).convert()
+            surf.fill(color)
+            self._fills[color] = surf
+        return surf
+
+    def begin(self, background):
+        """Erase last frame's sprites (or the whole screen after invalidate)."""
+        if background is not self._background:
+            self._background = background
+            self._full = True
+        if self._full:
+            self.screen.blit(background, (0, 0))
+        else:
+            for r in self._prev:
+                self.screen.blit(background, r, r)
+        self._cur = []
+
+    def add(self, rects):
+        """Record what was drawn this frame: a Rect, a list of Rects, or None."""
+        if rects is None:
+            return
+        if isinstance(rects, pygame.Rect):
+            self._cur.append(rects)
+        else:
+            self._cur.extend(rects)
+
+    def present(self):
+        if self._full:
+            self.display.flip()
+            self._full = False
+        else:
+            self.display.update(self._prev + self._cur)
+        self._prev = self._cur
+
+# ================== Composed backdrops ==================
+class Backdrop:
+    """A full screen drawn once per ``key`` and then blitted back as is."""
+    def __init__(self, screen):
+        self.screen = screen
+        self.key = None
+        self._surf = None
+
+    def draw(self, key, draw):
+        """Show the picture ``draw()`` paints on the screen for ``key``, calling
+        it only when ``key`` differs from last time."""
+        if key == self.key and self._surf is not None:
+            self.screen.blit(self._surf, (0, 0))
+            return
+        draw()
+        if self._surf is None:
+            self._surf = self.screen.copy()
+        else:
+            self._surf.blit(self.screen, (0, 0))
+        self.key = key
+
+    def invalidate(self):
+        self.key = None
+
+# ================== Scaled window ==================
+SCALE_FILTERS = ("integer", "smooth")
+
+class ScaledDisplay:
+    """A ``size`` buffer (``surface``) shown in a window of any size.
+
+    Drawing only ever touches ``surface``, so its cost doesn't depend on
+    the window; ``flip()`` scales the whole buffer to the window in one pass.
+    ``filter`` "integer" scales by the largest whole factor that fits
+    (nearest neighbour, black borders; a window smaller than ``size`` gets
+    the best fit instead); "smooth" fills the window, aspect kept, with
+    smoothscale. ``to_surface`` maps window positions (mouse) back.
+    """
+    def __init__(self, size, window_size=(0, 0), filter="integer", flags=0):
+        if filter not in SCALE_FILTERS:
+            raise ValueError(f"scale filter must be one of {SCALE_FILTERS}, not {filter!r}")
+        self.size = size
+        self.filter = filter
+        pygame.display.set_mode(window_size, flags)
+        self.surface = pygame.Surface(size).convert()
+        self.resize()
+
+    def resize(self):
+        """Fit the buffer to the window again (call after it changed size)."""
+        self.window = pygame.display.get_surface()
+        (w, h), (ww, wh) = self.size, self.window.get_size()
+        fit = min(ww / w, wh / h)
+        if self.filter == "integer" and fit >= 1:
+            fit = int(fit)
+        self.dest = pygame.Rect(0, 0, max(1, int(w * fit)), max(1, int(h * fit)))
+        self.dest.center = (ww // 2, wh // 2)
+        self.window.fill((0, 0, 0))
+        self._target = self.window.subsurface(self.dest)
+        pygame.display.flip()
+
+    def flip(self):
+        if self.filter == "smooth":
+            pygame.transform.smoothscale(self.surface, self.dest.size, self._target)
+        else:
+            pygame.transform.scale(self.surface, self.dest.size, self._target)
+        pygame.display.update(self.dest)
+
+    def update(self, rects=None):
+        # the whole buffer is scaled anyway; partial updates would only save the copy to the screen
+        self.flip()
+
+    def to_surface(self, pos):
+        """Window position ``pos`` in buffer coordinates (outside it for the borders)."""
+        x, y = pos
+        (w, h), dest = self.size, self.dest
+        return (int((x - dest.x) * w / dest.w), int((y - dest.y) * h / dest.h))
@@ -0,0 +1,215 @@
+"""Match replays: the inputs that drove a match, not video of it.
+
+``step`` is deterministic, so a match is reproduced by its starting sprite
+sizes plus every fighter's IN_* bitmask per frame. Inputs rarely change
+from one frame to the next, so only the frames where they do are stored.
+
+File layout (little-endian)::
+
+    b"NVSRPLY1"  u32 header length  JSON header
+    u32[changes]              frame number of each input change
+    u8[changes, fighters]     bitmasks from that frame on
+
+The header holds the fighter names, the roster (skins, starting spots,
+teams; absent means Naruto vs Sasuke), hit box sizes at frame 0 and at any
+mid-match rescale, free-form ``meta`` (map, scale) and the recorded result,
+so ``python replay.py *.nvsr`` can check that a build still plays them out
+the same way. Replays recorded with pixel-perfect hits need the sprites'
+collision masks, so for those the CLI loads the game's assets headless.
+"""
+import contextlib
+import json
+import os
+import struct
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from simulation import new_match, party_roster, step
+
+REPLAY_MAGIC = b"NVSRPLY1"
+REPLAY_VERSION = 2  # bump when step() plays the same inputs out differently
+
+def _sizes_entry(state, frame, extra=None):
+    entry = {
+        "frame": frame,
+        "fighters": {f.name: {k: [list(s) for s in v] for k, v in f.frame_sizes.items()}
+                     for f in state.fighters},
+        "bullets": None if state.bullet_sizes is None else state.bullet_sizes.tolist(),
+    }
+    entry.update(extra or {})
+    return entry
+
+class ReplayRecorder:
+    """Collects one match's inputs; call ``record`` before every step."""
+    def __init__(self, state, meta=None):
+        self.fighters = [f.name for f in state.fighters]
+        self.roster = [{"name": f.name, "skin": f.skin, "x": f.midbottom_x,
+                        "facing_right": f.facing_right, "team": f.team} for f in state.fighters]
+        self.meta = dict(meta or {})
+        self.start = state.frame
+        self.resizes = [_sizes_entry(state, 0)]
+        self.result = None
+        self._frames = []
+        self._inputs = []
+        self._last = None
+
+    def note_sizes(self, state, **extra):
+        """Sprite sizes changed (rescale); they apply from the next step on."""
+        entry = _sizes_entry(state, state.frame - self.start, extra)
+        if self.resizes[-1]["frame"] == entry["frame"]:
+            self.resizes[-1] = entry
+        else:
+            self.resizes.append(entry)
+
+    def record(self, state, inputs):
+        inputs = tuple(inputs)
+        if inputs != self._last:
+            self._frames.append(state.frame - self.start)
+            self._inputs.append(inputs)
+            self._last = inputs
+
+    def finish(self, state):
+        self.result = {"frames": state.frame - self.start, "winner": state.winner,
+                       "health": [f.health for f in state.fighters]}
+
+    def save(self, path):
+        header = {
+            "version": REPLAY_VERSION,
+            "fighters": self.fighters,
+            "roster": self.roster,
+            "meta": self.meta,
+            "resizes": self.resizes,
+            "result": self.result,
+            "changes": len(self._frames),
+        }
+        hdr = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        frames = np.asarray(self._frames, "<u4")
+        inputs = np.asarray(self._inputs, np.uint8).reshape(-1, len(self.fighters))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(REPLAY_MAGIC + struct.pack("<I", len(hdr)) + hdr)
+            f.write(frames.tobytes())
+            f.write(inputs.tobytes())
+        os.replace(tmp, path)
+
+class Replay:
+    """A loaded replay; ``inputs_at(frame)`` gives the bitmasks for any frame."""
+    def __init__(self, header, frames, inputs):
+        self.header = header
+        self.fighters = header["fighters"]
+        self.roster = header.get("roster") or party_roster(2)
+        self.meta = header.get("meta", {})
+        self.result = header.get("result")
+        self.frames = frames
+        self.inputs = inputs
+        self._resizes = {r["frame"]: r for r in header.get("resizes", [])}
+        self._idle = (0,) * len(self.fighters)
+
+    def __len__(self):
+        """Frames to play: up to the recorded result, or the last input change."""
+        if self.result:
+            return self.result["frames"]
+        return int(self.frames[-1]) + 1 if len(self.frames) else 0
+
+    def inputs_at(self, frame):
+        i = int(np.searchsorted(self.frames, frame, side="right")) - 1
+        return self._idle if i < 0 else tuple(self.inputs[i].tolist())
+
+    def resize_at(self, frame):
+        """The sizes entry recorded for ``frame``, or None."""
+        return self._resizes.get(frame)
+
+    def apply_sizes(self, state, frame):
+        """Give ``state`` the hit box sizes recorded for ``frame``, if any; returns the entry."""
+        entry = self._resizes.get(frame)
+        if entry is not None:
+            for f in state.fighters:
+                sizes = entry["fighters"].get(f.name)
+                f.set_frame_sizes({k: [tuple(s) for s in v] for k, v in (sizes or {}).items()})
+            state.set_bullet_sizes(entry["bullets"])
+        return entry
+
+    def new_state(self, masks=None):
+        state = new_match(roster=self.roster)
+        self.apply_sizes(state, 0)
+        if masks is not None:
+            masks.apply(state)
+        return state
+
+def load_replay(path):
+    with open(path, "rb") as f:
+        blob = f.read()
+    if blob[:8] != REPLAY_MAGIC:
+        raise ValueError(f"{path}: not a replay file")
+    (hlen,) = struct.unpack_from("<I", blob, 8)
+    header = json.loads(blob[12:12 + hlen])
+    if header.get("version") != REPLAY_VERSION:
+        raise ValueError(f"{path}: replay version {header.get('version')} not supported")
+    n, k = header["changes"], len(header["fighters"])
+    off = 12 + hlen
+    frames = np.frombuffer(blob, "<u4", n, off)
+    inputs = np.frombuffer(blob, np.uint8, n * k, off + 4 * n).reshape(n, k)
+    return Replay(header, frames, inputs)
+
+def play(replay, state=None, masks=None):
+    """Fast-forward ``replay`` with nothing drawn; returns the final state.
+
+    ``masks`` (sprites.CollisionMasks) is used if the replay was recorded
+    with pixel-perfect hits.
+    """
+    if not replay.meta.get("pixel_collision"):
+        masks = None
+    state = state or replay.new_state(masks)
+    frames, inputs = replay.frames.tolist(), replay.inputs.tolist()
+    cur, nxt = replay._idle, 0
+    for frame in range(len(replay)):
+        if nxt < len(frames) and frames[nxt] == frame:
+            cur = inputs[nxt]
+            nxt += 1
+        if replay.apply_sizes(state, frame) is not None and masks is not None:
+            masks.apply(state)
+        step(state, cur)
+        if state.game_over:
+            break
+    return state
+
+def check(replay, state):
+    """True if ``state`` ended the way the replay's recorded result says."""
+    r = replay.result
+    if r is None:
+        return True
+    return (state.frame == r["frames"] and state.winner == r["winner"]
+            and [f.health for f in state.fighters] == r["health"])
+
+def game_masks():
+    """The game's CollisionMasks, with its sprites loaded under the dummy SDL drivers."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    with contextlib.redirect_stdout(sys.stderr):
+        import naruto_vs_sasuke as game
+        game.loader.wait(game.match_assets())
+    return game.collision_masks
+
+if __name__ == "__main__":
+    failed = 0
+    masks = None
+    for path in sys.argv[1:]:
+        try:
+            rp = load_replay(path)
+        except ValueError as e:
+            print(f"{'skipped':8} {e}")  # recorded by a build with other rules
+            continue
+        if rp.meta.get("pixel_collision") and masks is None:
+            masks = game_masks()
+        t0 = perf_counter()
+        st = play(rp, masks=masks)
+        ms = (perf_counter() - t0) * 1000.0
+        ok = check(rp, st)
+        failed += not ok
+        print(f"{'ok' if ok else 'MISMATCH':8} {path}: {st.frame} frames in {ms:.1f} ms, "
+              f"winner {st.winner or '-'}, health {[f.health for f in st.fighters]}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,680 @@
+"""Render-free match simulation for Naruto vs Sasuke.
+
+Nothing in this module imports pygame: fighters, fireballs, melee and KO are
+plain Python state advanced by ``step(state, inputs)``. The game window feeds
+keyboard bitmasks in and draws the result; bots, balance sweeps and CI runs
+can drive the same code with no display at all.
+"""
+import random
+import sys
+import zlib
+from operator import attrgetter
+from time import perf_counter
+
+import numpy as np
+
+# ================== Arena / tuning ==================
+SCREEN_WIDTH, SCREEN_HEIGHT = 800, 600
+GROUND_Y = SCREEN_HEIGHT - 20  # feet a bit above bottom
+
+# Shooting tuning
+BULLET_SPEED = 14
+BULLET_DAMAGE = 12
+SHOOT_COOLDOWN_FRAMES = 18  # ~3 shots/sec at 60 fps
+
+# Melee tuning
+MELEE_DAMAGE = 5
+ATTACK_COOLDOWN_FRAMES = 30
+
+MAX_HEALTH = 100
+OFFSCREEN_MARGIN = 200
+
+# Melee broad phase: sweep and prune along x from this many fighters on;
+# below it testing every pair is cheaper
+SWEEP_MIN_FIGHTERS = 4
+
+# Sizes used when no sprite / fireball frames are available
+FALLBACK_FIGHTER_SIZE = (50, 80)
+FALLBACK_BULLET_SIZE = (16, 16)
+
+ANIM_NAMES = ["idle", "walk", "attack", "jump"]
+
+# ================== Inputs ==================
+# One bitmask per fighter per frame.
+IN_LEFT, IN_RIGHT, IN_JUMP, IN_ATTACK, IN_SHOOT = 1, 2, 4, 8, 16
+INPUT_BITS = {"left": IN_LEFT, "right": IN_RIGHT, "jump": IN_JUMP,
+              "attack": IN_ATTACK, "shoot": IN_SHOOT}
+
+def boxes_overlap(a, b):
+    """Same rule as pygame.Rect.colliderect for (x, y, w, h) tuples."""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    if aw <= 0 or ah <= 0 or bw <= 0 or bh <= 0:
+        return False
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+def masks_touch(mask_a, box_a, mask_b, box_b):
+    """Narrow phase after ``boxes_overlap``: do the opaque pixels meet?
+
+    Masks are anything with pygame.mask.Mask's ``overlap(other, offset)``
+    (the game passes real pygame masks); with either one missing the box
+    test stands.
+    """
+    if mask_a is None or mask_b is None:
+        return True
+    return mask_a.overlap(mask_b, (box_b[0] - box_a[0], box_b[1] - box_a[1])) is not None
+
+def sweep_and_prune(a_boxes, b_boxes):
+    """Broad phase: (i, j) pairs of ``a_boxes[i]`` and ``b_boxes[j]`` whose x
+    extents overlap, found by sorting every box's left edge and sweeping.
+
+    Cost grows with the boxes that are actually side by side, not with
+    len(a) * len(b). Pairs come back sorted; callers still run the full test.
+    """
+    edges = sorted([(b[0], 0, i, b[0] + b[2]) for i, b in enumerate(a_boxes)]
+                   + [(b[0], 1, j, b[0] + b[2]) for j, b in enumerate(b_boxes)])
+    active = ([], [])
+    pairs = []
+    for left, side, idx, right in edges:
+        other = active[1 - side]
+        other[:] = [(r, k) for r, k in other if r > left]
+        for _, k in other:
+            pairs.append((idx, k) if side == 0 else (k, idx))
+        active[side].append((right, idx))
+    pairs.sort()
+    return pairs
+
+def attack_size(w, h):
+    """(w, h) of the melee box of a fighter whose hurt box is w x h."""
+    return max(20, int(w * 0.5)), max(20, int(h * 0.3))
+
+# ================== Fighter ==================
+class Fighter:
+    """Physics and combat state of one fighter.
+
+    ``frame_sizes`` maps an animation name to the (w, h) of each of its frames;
+    the hurt box follows the current frame exactly like the sprite did.
+    ``frame_masks`` optionally holds a (right, left, attack) mask per frame
+    for pixel-perfect hits (see ``sprites.CollisionMasks``). ``skin`` names
+    the sprite set (several fighters may share one); fighters with the same
+    ``team`` never hurt each other, and ``team=None`` means every fighter
+    for themselves.
+    """
+    __slots__ = ("name", "frame_sizes", "frame_masks", "skin", "team", "anim_state", "anim_tick", "frame_duration",
+                 "facing_right", "vel", "jump_power", "gravity", "vy", "health",
+                 "is_jumping", "is_attacking", "attack_cooldown", "shoot_cooldown",
+                 "midbottom_x", "midbottom_y", "rx", "ry", "rw", "rh", "prev_midbottom")
+
+    def __init__(self, x, ground_y, name, frame_sizes=None, facing_right=True, team=None, skin=None):
+        self.name = name
+        self.frame_sizes = frame_sizes or {}
+        self.frame_masks = {}
+        self.skin = skin or name
+        self.team = team
+        self.anim_state = "idle"
+        self.anim_tick = 0
+        self.frame_duration = 6
+        self.facing_right = facing_right
+
+        self.vel = 5
+        self.jump_power = 15
+        self.gravity = 0.8
+        self.vy = 0.0
+        self.health = MAX_HEALTH
+        self.is_jumping = False
+        self.is_attacking = False
+        self.attack_cooldown = 0
+        self.shoot_cooldown = 0
+
+        self.midbottom_x = x
+        self.midbottom_y = ground_y
+
+        self.rw, self.rh = self._peek_size() or FALLBACK_FIGHTER_SIZE
+        self.rx, self.ry = 0, 0
+        self._set_midbottom(self.midbottom_x, self.midbottom_y)
+        self.prev_midbottom = self.box_midbottom()
+
+    # ---- hurt box helpers (pygame.Rect semantics, integer coordinates) ----
+    def _set_midbottom(self, x, y):
+        self.rx = int(x) - self.rw // 2
+        self.ry = int(y) - self.rh
+
+    def box(self):
+        return (self.rx, self.ry, self.rw, self.rh)
+
+    def box_midbottom(self):
+        return (self.rx + self.rw // 2, self.ry + self.rh)
+
+    def lerp_midbottom(self, alpha):
+        """Hurt box midbottom ``alpha`` of the way from the previous step to this one."""
+        (px, py), (x, y) = self.prev_midbottom, self.box_midbottom()
+        return (int(round(px + (x - px) * alpha)), int(round(py + (y - py) * alpha)))
+
+    def _peek_size(self):
+        for k in ANIM_NAMES:
+            sizes = self.frame_sizes.get(k)
+            if sizes:
+                return sizes[0]
+        for sizes in self.frame_sizes.values():
+            if sizes:
+                return sizes[0]
+        return None
+
+    def frame_ref(self):
+        """(anim name, frame index) currently shown, or None without frames."""
+        key = self.anim_state
+        sizes = self.frame_sizes.get(key)
+        if not sizes:
+            for key in ANIM_NAMES:
+                sizes = self.frame_sizes.get(key)
+                if sizes:
+                    break
+        if not sizes:
+            return None
+        return key, (self.anim_tick // self.frame_duration) % len(sizes)
+
+    def set_frame_sizes(self, frame_sizes):
+        self.frame_sizes = frame_sizes or {}
+        size = self._peek_size()
+        if size is not None:
+            self.rw, self.rh = size
+            self._set_midbottom(self.midbottom_x, self.midbottom_y)
+
+    def snapshot(self):
+        """Every field as a tuple, for rollback; ``restore`` puts it back."""
+        return _fighter_fields(self)
+
+    def restore(self, snap):
+        for name, value in zip(Fighter.__slots__, snap):
+            setattr(self, name, value)
+
+    def set_frame_masks(self, frame_masks):
+        self.frame_masks = frame_masks or {}
+
+    def masks(self):
+        """(body mask facing the current way, attack mask) of the current frame, or None."""
+        ref = self.frame_ref()
+        if ref is None:
+            return None
+        frames = self.frame_masks.get(ref[0])
+        if not frames or ref[1] >= len(frames):
+            return None
+        right, left, attack = frames[ref[1]]
+        return (right if self.facing_right else left), attack
+
+    def reset(self, x, ground_y, facing_right=None):
+        """Back to a fresh fighter's state at ``x`` (same as constructing a new one)."""
+        self.health = MAX_HEALTH
+        self.midbottom_x, self.midbottom_y = x, ground_y
+        if facing_right is not None:
+            self.facing_right = facing_right
+        self.anim_state = "idle"
+        self.anim_tick = 0
+        self.vy = 0.0
+        self.is_jumping = False
+        self.is_attacking = False
+        self.attack_cooldown = 0
+        self.shoot_cooldown = 0
+        self.rw, self.rh = self._peek_size() or FALLBACK_FIGHTER_SIZE
+        self._set_midbottom(x, ground_y)
+        self.prev_midbottom = self.box_midbottom()
+
+    def move_and_actions(self, buttons, ground_y, events, width=SCREEN_WIDTH):
+        """Moves, handles jump/melee/shoot. Returns (x, y, facing_right) of a new shot or None."""
+        self.prev_midbottom = self.box_midbottom()
+        prev_state = self.anim_state
+        self.anim_state = "idle"
+        shot = None
+
+        if buttons & IN_LEFT:
+            self.midbottom_x -= self.vel
+            self.facing_right = False
+            self.anim_state = "walk"
+        if buttons & IN_RIGHT:
+            self.midbottom_x += self.vel
+            self.facing_right = True
+            self.anim_state = "walk"
+        if buttons & IN_JUMP and not self.is_jumping:
+            self.vy = -self.jump_power
+            self.is_jumping = True
+        # Melee
+        if buttons & IN_ATTACK and self.attack_cooldown <= 0:
+            self.is_attacking = True
+            self.attack_cooldown = ATTACK_COOLDOWN_FRAMES
+            events.append(("attack", self.name))
+        # Shoot
+        if buttons & IN_SHOOT and self.shoot_cooldown <= 0:
+            chest_y = (self.ry + self.rh // 2) - self.rh * 0.1
+            muzzle_x = self.rx + self.rw if self.facing_right else self.rx
+            shot = (muzzle_x, chest_y, self.facing_right)
+            self.shoot_cooldown = SHOOT_COOLDOWN_FRAMES
+            events.append(("shoot", self.name))
+
+        if self.is_attacking:
+            self.anim_state = "attack"
+
+        if self.anim_state != prev_state:
+            self.anim_tick = 0
+        else:
+            self.anim_tick += 1
+
+        # Gravity
+        self.vy += self.gravity
+        self.midbottom_y += self.vy
+
+        # Hurt box follows the current frame (size may change)
+        ref = self.frame_ref()
+        if ref is not None:
+            self.rw, self.rh = self.frame_sizes[ref[0]][ref[1]]
+        self._set_midbottom(self.midbottom_x, self.midbottom_y)
+
+        # Ground clamp
+        if self.ry + self.rh > ground_y:
+            self.ry = ground_y - self.rh
+            self.midbottom_y = ground_y
+            self.vy = 0
+            self.is_jumping = False
+
+        # Screen clamp horizontally
+        self.rx = max(0, min(self.rx, width - self.rw))
+        self.midbottom_x = self.rx + self.rw // 2
+
+        # Cooldowns
+        if self.attack_cooldown > 0:
+            self.attack_cooldown -= 1
+        else:
+            self.is_attacking = False
+
+        if self.shoot_cooldown > 0:
+            self.shoot_cooldown -= 1
+
+        return shot
+
+    def attack_box(self):
+        w, h = attack_size(self.rw, self.rh)
+        offset = int(self.rw * 0.6) if self.facing_right else -int(self.rw * 1.1)
+        x = self.rx + self.rw // 2 + offset
+        y = self.ry + self.rh // 2 - h // 2
+        return (x, y, w, h)
+
+_fighter_fields = attrgetter(*Fighter.__slots__)
+
+# ================== Bullets ==================
+class BulletPool:
+    """Live fireballs as NumPy struct-of-arrays.
+
+    Rows ``[0, n)`` are live. Advancing, culling and collision run as batched
+    array operations; dead rows are filled by swapping in live rows from the
+    tail, so removal never shifts the arrays.
+    """
+    FIELDS = ("x", "y", "vx", "px", "owner", "frame_idx", "alive")
+
+    def __init__(self, capacity=64):
+        self.n = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        self.x = np.zeros(capacity, np.float64)
+        self.y = np.zeros(capacity, np.float64)
+        self.vx = np.zeros(capacity, np.float64)
+        self.px = np.zeros(capacity, np.float64)  # x before the last update, for render interpolation
+        self.owner = np.zeros(capacity, np.int16)  # index into MatchState.fighters
+        self.frame_idx = np.zeros(capacity, np.int32)
+        self.alive = np.zeros(capacity, np.bool_)
+
+    def __len__(self):
+        return self.n
+
+    def clear(self):
+        self.alive[:self.n] = False
+        self.n = 0
+
+    def spawn(self, x, y, facing_right, owner):
+        n = self.n
+        if n == self.alive.size:
+            old = [getattr(self, f)[:n] for f in self.FIELDS]
+            self._alloc(2 * n)
+            for f, arr in zip(self.FIELDS, old):
+                getattr(self, f)[:n] = arr
+        self.x[n] = x
+        self.px[n] = x
+        self.y[n] = y
+        self.vx[n] = BULLET_SPEED if facing_right else -BULLET_SPEED
+        self.owner[n] = owner
+        self.frame_idx[n] = 0
+        self.alive[n] = True
+        self.n = n + 1
+
+    def update(self, n_frames):
+        n = self.n
+        self.px[:n] = self.x[:n]
+        self.x[:n] += self.vx[:n]
+        self.frame_idx[:n] += 1
+        self.frame_idx[:n] %= max(1, n_frames)
+
+    def lerp_x(self, alpha):
+        """x of live rows ``alpha`` of the way from the previous update to the current one."""
+        n = self.n
+        return self.x[:n] - (self.x[:n] - self.px[:n]) * (1.0 - alpha)
+
+    def boxes(self, sizes):
+        """(left, top, w, h) for live rows; ``sizes`` is an (n_frames, 2) array or None.
+
+        w and h are plain ints when every row uses the fallback size.
+        """
+        n = self.n
+        if sizes is None:
+            w, h = FALLBACK_BULLET_SIZE
+        else:
+            wh = sizes[self.frame_idx[:n]]
+            w, h = wh[:, 0], wh[:, 1]
+        left = self.x[:n].astype(np.int64) - w // 2
+        top = self.y[:n].astype(np.int64) - h // 2
+        return left, top, w, h
+
+    def collide(self, fighters, sizes, masks=None, teams=None, standing=None):
+        """Kill rows overlapping a fighter not on their owner's team.
+
+        ``teams`` holds a team number per fighter (default: everyone on their
+        own); fighters whose ``standing`` entry is false (knocked out) are
+        passed through. Each bullet hits at most the first such fighter. With ``masks``
+        (a (right, left) mask pair per frame) rows whose box meets a
+        fighter's are also checked pixel by pixel against that fighter's
+        mask. Returns a list of (owner index, target index) per hit, by
+        target then row.
+        """
+        n = self.n
+        if n == 0:
+            return []
+        if teams is None:
+            teams = np.arange(len(fighters), dtype=np.int16)
+        left, top, w, h = self.boxes(sizes)
+        owner = self.owner[:n]
+        owner_team = teams[owner]
+        free = self.alive[:n].copy()
+        hits = []
+        for i, f in enumerate(fighters):
+            if standing is not None and not standing[i]:
+                continue
+            fx, fy, fw, fh = f.box()
+            hit = (free & (owner_team != teams[i]) & (left < fx + fw) & (fx < left + w)
+                   & (top < fy + fh) & (fy < top + h))
+            if hit.any():
+                idx = np.flatnonzero(hit)
+                if masks is not None:
+                    idx = self._touching(idx, f, fx, fy, masks, left, top)
+                    if not len(idx):
+                        continue
+                free[idx] = False
+                hits.extend((int(o), i) for o in owner[idx])
+        self.alive[:n] = free
+        return hits
+
+    def _touching(self, idx, fighter, fx, fy, masks, left, top):
+        """Rows of ``idx`` whose frame mask meets ``fighter``'s body mask."""
+        body = fighter.masks()
+        if body is None:
+            return idx
+        body = body[0]
+        fi, vx = self.frame_idx, self.vx
+        return np.array([j for j in idx.tolist()
+                         if body.overlap(masks[fi[j]][0 if vx[j] >= 0 else 1],
+                                         (int(left[j]) - fx, int(top[j]) - fy)) is not None], np.intp)
+
+    def snapshot(self):
+        n = self.n
+        return n, tuple(getattr(self, f)[:n].copy() for f in self.FIELDS)
+
+    def restore(self, snap):
+        n, arrays = snap
+        if n > self.alive.size:
+            self._alloc(max(n, 2 * self.alive.size))
+        for f, arr in zip(self.FIELDS, arrays):
+            getattr(self, f)[:n] = arr
+        self.alive[n:max(n, self.n)] = False
+        self.n = n
+
+    def cull_offscreen(self, width=SCREEN_WIDTH):
+        # allow some margin
+        x = self.x[:self.n]
+        self.alive[:self.n] &= (x >= -OFFSCREEN_MARGIN) & (x <= width + OFFSCREEN_MARGIN)
+
+    def compact(self):
+        """Swap-remove dead rows: live rows from the tail fill holes near the front."""
+        n = self.n
+        alive = self.alive[:n]
+        n_keep = int(np.count_nonzero(alive))
+        if n_keep == n:
+            return
+        holes = np.flatnonzero(~alive[:n_keep])
+        movers = np.flatnonzero(alive[n_keep:]) + n_keep
+        for f in self.FIELDS[:-1]:
+            arr = getattr(self, f)
+            arr[holes] = arr[movers]
+        self.alive[:n_keep] = True
+        self.alive[n_keep:n] = False
+        self.n = n_keep
+
+# ================== Match ==================
+class MatchState:
+    """Everything ``step`` needs. ``events`` holds what happened during the last step:
+
+    ("attack", name), ("shoot", name), ("hit", attacker, target, damage, kind, swing), ("ko", winner)
+
+    A melee swing hits on every frame it touches; ``swing`` is the frame it
+    started on, the same for all of them (None for a fireball).
+    """
+    def __init__(self, fighters, bullet_sizes=None, ground_y=GROUND_Y, width=SCREEN_WIDTH):
+        self.fighters = list(fighters)
+        self.update_teams()
+        self.bullets = BulletPool()
+        self.set_bullet_sizes(bullet_sizes)
+        self.bullet_masks = None
+        self.ground_y = ground_y
+        self.width = width
+        self.frame = 0
+        self.game_over = False
+        self.winner = ""
+        self.events = []
+
+    def update_teams(self):
+        """Refresh ``team_idx`` (one int per fighter, equal for allies) after changing teams."""
+        ids = {}
+        self.team_idx = np.array([ids.setdefault(("team", f.team) if f.team is not None else ("solo", i), len(ids))
+                                  for i, f in enumerate(self.fighters)], np.int16)
+
+    def side(self, i):
+        """What fighter ``i`` wins as: their team, or their name in a free-for-all."""
+        f = self.fighters[i]
+        return f.team if f.team is not None else f.name
+
+    def set_bullet_sizes(self, bullet_sizes):
+        """(w, h) of each fireball frame; empty means the 16x16 fallback."""
+        self.bullet_sizes = np.array(bullet_sizes, np.int64).reshape(-1, 2) if bullet_sizes else None
+
+    def set_bullet_masks(self, bullet_masks):
+        """A (right, left) mask per fireball frame, matching ``bullet_sizes``; None for box hits."""
+        self.bullet_masks = bullet_masks or None
+
+    def snapshot(self):
+        """Cheap copy of everything ``step`` changes (for rollback netplay)."""
+        return (self.frame, self.game_over, self.winner,
+                [f.snapshot() for f in self.fighters], self.bullets.snapshot())
+
+    def restore(self, snap):
+        self.frame, self.game_over, self.winner, fighters, bullets = snap
+        for f, fs in zip(self.fighters, fighters):
+            f.restore(fs)
+        self.bullets.restore(bullets)
+        self.events.clear()
+
+def snapshot_checksum(snap):
+    """CRC32 of a MatchState snapshot, to compare peers' matches frame by frame."""
+    frame, game_over, winner, fighters, (n, arrays) = snap
+    # skip name, frame_sizes and frame_masks: the same on both sides and costly to repr
+    crc = zlib.crc32(repr((frame, game_over, winner, [fs[3:] for fs in fighters])).encode())
+    for arr in arrays:
+        crc = zlib.crc32(arr.tobytes(), crc)
+    return crc
+
+# ================== Rosters ==================
+# A roster lists a match's fighters as dicts: name, skin (sprite set), x,
+# facing_right and team (None = free-for-all). Replays store it as is.
+SKINS = ["Naruto", "Sasuke"]
+
+def party_roster(n=2, teams=0):
+    """``n`` fighters spread along the floor, skins alternating; with ``teams``
+    > 1 fighter i joins "Team (i % teams) + 1", otherwise free-for-all.
+    ``party_roster(2)`` is the classic Naruto (left) vs Sasuke (right) match."""
+    roster = []
+    for i in range(n):
+        skin = SKINS[i % len(SKINS)]
+        x = 150 + (500 * i) // max(1, n - 1)
+        roster.append({
+            "name": skin if i < len(SKINS) else f"{skin} {i // len(SKINS) + 1}",
+            "skin": skin,
+            "x": x,
+            "facing_right": x < SCREEN_WIDTH // 2,
+            "team": f"Team {i % teams + 1}" if teams > 1 else None,
+        })
+    return roster
+
+def new_match(frame_sizes=None, bullet_sizes=None, roster=None):
+    """A match for ``roster`` (default: Naruto vs Sasuke); ``frame_sizes`` is keyed by skin."""
+    frame_sizes = frame_sizes or {}
+    return MatchState([
+        Fighter(r["x"], GROUND_Y, r["name"], frame_sizes.get(r.get("skin") or r["name"]),
+                facing_right=r["facing_right"], team=r.get("team"), skin=r.get("skin"))
+        for r in (roster or party_roster(2))
+    ], bullet_sizes=bullet_sizes)
+
+def step(state, inputs, mark=None):
+    """Advance ``state`` by one frame in place and return it.
+
+    ``inputs`` holds one IN_* bitmask per fighter, in ``state.fighters`` order.
+    ``mark(phase)``, if given, is called after each phase (see profiler.py).
+    """
+    events = state.events
+    events.clear()
+    if state.game_over:
+        return state
+    fighters = state.fighters
+    ground_y, width = state.ground_y, state.width
+    # knocked out in an earlier step: out of the match (party mode goes on without them)
+    standing = [f.health > 0 for f in fighters]
+
+    # Move + actions (may spawn a bullet)
+    bullets = state.bullets
+    for i, (f, buttons) in enumerate(zip(fighters, inputs)):
+        if not standing[i]:
+            continue
+        shot = f.move_and_actions(buttons, ground_y, events, width)
+        if shot is not None:
+            bullets.spawn(shot[0], shot[1], shot[2], i)
+    if mark: mark("move")
+
+    # Melee hits: attack boxes against everyone side by side with them
+    attackers = [i for i, f in enumerate(fighters) if f.is_attacking and standing[i]]
+    if attackers:
+        teams = state.team_idx
+        atks = [fighters[i].attack_box() for i in attackers]
+        boxes = [f.box() for f in fighters]
+        if len(fighters) >= SWEEP_MIN_FIGHTERS:
+            pairs = sweep_and_prune(atks, boxes)
+        else:
+            pairs = [(a, j) for a in range(len(atks)) for j in range(len(boxes))]
+        for a, j in pairs:
+            i = attackers[a]
+            if teams[i] == teams[j] or not standing[j] or not boxes_overlap(atks[a], boxes[j]):
+                continue
+            f, other = fighters[i], fighters[j]
+            # pixel test only once the boxes meet
+            fm, om = f.masks(), other.masks()
+            if fm is not None and om is not None and not masks_touch(fm[1], atks[a], om[0], boxes[j]):
+                continue
+            other.health -= MELEE_DAMAGE
+            swing = state.frame - (ATTACK_COOLDOWN_FRAMES - 1 - f.attack_cooldown)
+            events.append(("hit", f.name, other.name, MELEE_DAMAGE, "melee", swing))
+    if mark: mark("melee")
+
+    # Bullets update + collisions (with anyone but the owner)
+    if bullets.n:
+        sizes = state.bullet_sizes
+        bullets.update(0 if sizes is None else len(sizes))
+        for owner, target in bullets.collide(fighters, sizes, state.bullet_masks, state.team_idx, standing):
+            fighters[target].health -= BULLET_DAMAGE
+            events.append(("hit", fighters[owner].name, fighters[target].name, BULLET_DAMAGE, "bullet", None))
+        bullets.cull_offscreen(width)
+        bullets.compact()
+    if mark: mark("bullets")
+
+    # KO: over once someone is down and at most one side is left standing
+    survivors = [i for i, f in enumerate(fighters) if f.health > 0]
+    if len(survivors) < len(fighters) and len({state.team_idx[i] for i in survivors}) <= 1:
+        state.winner = state.side(survivors[0] if survivors else len(fighters) - 1)
+        state.game_over = True
+        events.append(("ko", state.winner))
+
+    state.frame += 1
+    return state
+
+# ================== Fixed timestep ==================
+class FixedTimestep:
+    """Runs step() at a fixed rate whatever the render rate.
+
+    Each rendered frame, ``advance(now)`` adds the elapsed time to an
+    accumulator and returns how many steps to run; ``alpha`` is how far the
+    leftover time reaches into the next step, for interpolating positions.
+    At most ``max_steps`` run per frame and any further backlog is dropped,
+    so a slow machine slows the match down instead of spiralling.
+    """
+    def __init__(self, hz=60, max_steps=5):
+        self.dt = 1.0 / hz
+        self.max_steps = max_steps
+        self.acc = 0.0
+        self.last = None
+
+    def reset(self):
+        """Forget elapsed time (pause, menus), so resuming doesn't catch up."""
+        self.last = None
+        self.acc = 0.0
+
+    def advance(self, now):
+        if self.last is None:
+            self.last = now
+            return 0
+        self.acc += now - self.last
+        self.last = now
+        n = int(self.acc / self.dt)
+        if n > self.max_steps:
+            n = self.max_steps
+            self.acc = 0.0
+        else:
+            self.acc -= n * self.dt
+        return n
+
+    @property
+    def alpha(self):
+        return min(1.0, self.acc / self.dt)
+
+# ================== Headless run ==================
+def random_inputs(rng, n):
+    return [rng.getrandbits(5) for _ in range(n)]
+
+def run_headless(frames=100000, seed=0):
+    """Step random-input matches back to back; returns (frames, seconds, ko_count)."""
+    rng = random.Random(seed)
+    state = new_match()
+    kos = 0
+    t0 = perf_counter()
+    for _ in range(frames):
+        step(state, random_inputs(rng, len(state.fighters)))
+        if state.game_over:
+            kos += 1
+            state = new_match()
+    return frames, perf_counter() - t0, kos
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    frames, secs, kos = run_headless(n)
+    print(f"{frames} frames in {secs:.2f}s ({frames / secs:.0f} fps), {kos} KOs")
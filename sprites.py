@@ -0,0 +1,537 @@
+"""Sprite sheet slicing, scaling and the on-disk atlas cache.
+
+Surfaces are converted with convert_alpha, so a display mode must be set
+before anything here is called (the dummy SDL video driver is enough).
+Loaders take ``convert=False`` to return plain RGBA surfaces instead, which
+is what the background loader uses off the main thread.
+"""
+import hashlib
+import json
+import os
+import struct
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+from PIL import Image
+
+from simulation import ANIM_NAMES, attack_size
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+ATLAS_DIR = os.path.join(CACHE_DIR, "atlas")
+
+# ================== Sheet loading helpers ==================
+def pil_to_surface_alpha(img: Image.Image, convert=True) -> pygame.Surface:
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    data = img.tobytes()
+    surf = pygame.image.fromstring(data, img.size, "RGBA")
+    return surf.convert_alpha() if convert else surf
+
+def convert_frames(anims):
+    """convert_alpha every frame of an {anim: [Surface]} dict (main thread only)."""
+    return {k: [f.convert_alpha() for f in frames] for k, frames in anims.items()}
+
+def load_grid_sheet(sheet_path, cols, rows, boxes=None, convert=True):
+    if not os.path.isfile(sheet_path):
+        print("Sprite sheet not found:", sheet_path)
+        return {}
+    img = Image.open(sheet_path).convert("RGBA")
+    W, H = img.size
+    fw, fh = W // cols, H // rows
+    animations = {}
+    for r in range(rows):
+        anim_name = ANIM_NAMES[r] if r < len(ANIM_NAMES) else f"row{r}"
+        frames = []
+        for c in range(cols):
+            box = (c*fw, r*fh, (c+1)*fw, (r+1)*fh)
+            frame = img.crop(box)
+            frames.append(pil_to_surface_alpha(frame, convert))
+        animations[anim_name] = frames
+        if boxes is not None:
+            boxes[anim_name] = [(c*fw, r*fh, (c+1)*fw, (r+1)*fh) for c in range(cols)]
+        print(f"Loaded {len(frames)} frames for {anim_name} (grid).")
+    img.close()
+    return animations
+
+AUTOSCAN_MIN_RUN = 10   # px; narrower column runs (or shorter rows) are specks, not frames
+AUTOSCAN_PAD = 4        # px of margin kept around each frame
+AUTOSCAN_BRIGHTNESS = 8  # pixels this dark or darker count as background
+
+def _runs(occupied, min_len=0):
+    """(starts, ends) of the runs of True in a 1-D bool array longer than ``min_len``."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], occupied, [False])).view(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = ends - starts > min_len
+    return starts[keep], ends[keep]
+
+def _autoscan_image(sheet_path, crop_bottom_px):
+    """(RGBA array with dark pixels made transparent, foreground mask) or (None, None)."""
+    if not os.path.isfile(sheet_path):
+        print("Sprite sheet not found:", sheet_path)
+        return None, None
+    with Image.open(sheet_path) as img:
+        px = np.array(img.convert("RGBA"))
+    H = px.shape[0]
+    if 0 < crop_bottom_px < H:
+        px = px[:H - crop_bottom_px]
+    brightness = 0.2126*px[:,:,0] + 0.7152*px[:,:,1] + 0.0722*px[:,:,2]
+    mask = brightness > AUTOSCAN_BRIGHTNESS
+    px[:, :, 3] = mask * np.uint8(255)
+    return px, mask
+
+def _autoscan_band(mask, y0, y1, expected=0):
+    """Frame boxes (x0, y0, x1, y1, padded) in rows ``y0:y1`` of ``mask``, left to right.
+
+    Frames are the runs of non-empty columns; each is trimmed to its own
+    topmost and bottommost pixel, all frames at once with reduceat.
+    """
+    H, W = mask.shape
+    band = mask[y0:y1]
+    xs0, xs1 = _runs(band.any(axis=0), AUTOSCAN_MIN_RUN)
+    if expected and len(xs0) > expected:
+        widest = np.sort(np.argsort(xs0 - xs1, kind="stable")[:expected])
+        xs0, xs1 = xs0[widest], xs1[widest]
+    if not len(xs0):
+        return []
+    # reduce over [x0, x1) of each frame only: the gaps can hold dropped specks
+    # or frames. reduceat wants indices < W, and the tail after W is the last frame.
+    bounds = np.column_stack((xs0, xs1)).ravel()
+    if bounds[-1] == W:
+        bounds = bounds[:-1]
+    rows = np.logical_or.reduceat(band, bounds, axis=1)[:, ::2]
+    top = y0 + rows.argmax(axis=0)
+    bottom = y1 - rows[::-1].argmax(axis=0)
+    pad = AUTOSCAN_PAD
+    return list(zip(np.maximum(0, xs0 - pad).tolist(), np.maximum(0, top - pad).tolist(),
+                    np.minimum(W, xs1 + pad).tolist(), np.minimum(H, bottom + pad).tolist()))
+
+def _crop_surfaces(px, frame_boxes, convert=True):
+    """Surfaces for (x0, y0, x1, y1) boxes of an RGBA array, straight from its bytes."""
+    frames = []
+    for x0, y0, x1, y1 in frame_boxes:
+        surf = pygame.image.frombuffer(np.ascontiguousarray(px[y0:y1, x0:x1]).tobytes(), (x1 - x0, y1 - y0), "RGBA")
+        frames.append(surf.convert_alpha() if convert else surf)
+    return frames
+
+def load_autoscan_row(sheet_path, expected=0, crop_bottom_px=0, boxes=None, convert=True):
+    """One row of frames separated by empty columns, all as "idle"."""
+    px, mask = _autoscan_image(sheet_path, crop_bottom_px)
+    if px is None:
+        return {}
+    frame_boxes = _autoscan_band(mask, 0, mask.shape[0], expected)
+    frames = _crop_surfaces(px, frame_boxes, convert)
+
+    if expected and len(frames) != expected:
+        print(f"[autoscan] Warning: expected ~{expected} frames, got {len(frames)}")
+
+    animations = {"idle": frames if frames else []}
+    if boxes is not None:
+        boxes["idle"] = frame_boxes
+    print(f"Loaded {len(frames)} frames via autoscan.")
+    return animations
+
+def load_autoscan(sheet_path, expected=0, crop_bottom_px=0, names=None, boxes=None, convert=True):
+    """Rows of frames: bands of non-empty pixel rows, each cut like load_autoscan_row.
+
+    Row r becomes animation ``names[r]`` (default ANIM_NAMES, then "row<r>").
+    ``expected`` caps the frames kept per row to the widest ones.
+    """
+    px, mask = _autoscan_image(sheet_path, crop_bottom_px)
+    if px is None:
+        return {}
+    names = list(names or ANIM_NAMES)
+    ys0, ys1 = _runs(mask.any(axis=1), AUTOSCAN_MIN_RUN)
+    animations = {}
+    for r, (y0, y1) in enumerate(zip(ys0.tolist(), ys1.tolist())):
+        anim_name = names[r] if r < len(names) else f"row{r}"
+        frame_boxes = _autoscan_band(mask, y0, y1, expected)
+        animations[anim_name] = _crop_surfaces(px, frame_boxes, convert)
+        if boxes is not None:
+            boxes[anim_name] = frame_boxes
+        print(f"Loaded {len(frame_boxes)} frames for {anim_name} (autoscan).")
+    if not animations:
+        print(f"[autoscan] Warning: no rows found in {os.path.basename(sheet_path)}")
+    return animations
+
+def load_sheet_by_cfg(path, cfg, boxes=None, convert=True):
+    """Slice a sheet per its SHEET_CFG_*. Fills ``boxes`` (if given) with each frame's
+    (x0, y0, x1, y1) in the sheet."""
+    mode = cfg.get("mode", "grid")
+    if mode == "grid":
+        cols = int(cfg.get("cols", 4)); rows = int(cfg.get("rows", 1))
+        return load_grid_sheet(path, cols, rows, boxes, convert)
+    elif mode == "autoscan_row":
+        expected = int(cfg.get("expected", 0)); crop = int(cfg.get("crop_bottom_px", 0))
+        return load_autoscan_row(path, expected=expected, crop_bottom_px=crop, boxes=boxes, convert=convert)
+    elif mode == "autoscan":
+        expected = int(cfg.get("expected", 0)); crop = int(cfg.get("crop_bottom_px", 0))
+        return load_autoscan(path, expected=expected, crop_bottom_px=crop, names=cfg.get("rows"),
+                             boxes=boxes, convert=convert)
+    else:
+        print(f"Unknown mode '{mode}' for {os.path.basename(path)}; defaulting to grid 4x1.")
+        return load_grid_sheet(path, 4, 1, boxes, convert)
+
+class FacingFrames(list):
+    """Right-facing frames (the list itself) with mirrored copies in ``left``.
+
+    The mirrored set is built once here, so drawing a left-facing sprite is a
+    lookup instead of a per-frame pygame.transform.flip.
+    """
+    def __init__(self, frames=()):
+        super().__init__(frames)
+        self.left = [pygame.transform.flip(f, True, False) for f in self]
+
+    @property
+    def sizes(self):
+        return [f.get_size() for f in self]
+
+    def facing(self, facing_right):
+        return self if facing_right else self.left
+
+    def nbytes(self):
+        return sum(w * h * 4 * 2 for w, h in self.sizes)
+
+def local_frame(anims, name, i, facing_right, fallbacks=()):
+    """Frame ``i`` of ``anims[name]`` facing the given way, or None.
+
+    A replay's hit boxes come from the recording machine's sheets, which may
+    have other animations or frame counts than these: a missing animation
+    falls back to the first of ``fallbacks`` found, and ``i`` wraps around.
+    """
+    frames = anims.get(name)
+    if not frames:
+        frames = next((anims[k] for k in fallbacks if anims.get(k)), None)
+        if not frames:
+            return None
+    return frames.facing(facing_right)[i % len(frames)]
+
+def scaled_size(surf, factor):
+    w, h = surf.get_width(), surf.get_height()
+    return max(1, int(round(w*factor))), max(1, int(round(h*factor)))
+
+def scale_surface(surf, size):
+    try:
+        return pygame.transform.smoothscale(surf, size).convert_alpha()
+    except Exception:
+        return pygame.transform.scale(surf, size).convert_alpha()
+
+def rescale_animations(anims, factor: float):
+    if not anims:
+        return {}
+    scaled = {}
+    for k, frames in anims.items():
+        scaled[k] = FacingFrames([scale_surface(f, scaled_size(f, factor)) for f in frames])
+    return scaled
+
+def rescale_fireballs(frames, factor: float):
+    if not frames:
+        return []
+    return FacingFrames([scale_surface(f, scaled_size(f, factor)) for f in frames])
+
+# ================== Multi-scale frame cache ==================
+class ScaledFrames:
+    """Frames scaled by ``factor`` one at a time, the first time each is drawn.
+
+    Used like FacingFrames: ``sizes`` is known up front (the simulation needs
+    hurt boxes before anything is drawn) and ``facing()`` returns an indexable
+    view that scales, and mirrors, on demand.
+    """
+    def __init__(self, src, factor):
+        self._src = list(src)
+        self.sizes = [scaled_size(f, factor) for f in self._src]
+        self._right = [None] * len(self._src)
+        self._left = [None] * len(self._src)
+        self._views = (_FacingView(self, True), _FacingView(self, False))
+
+    def __len__(self):
+        return len(self._src)
+
+    def frame(self, i, facing_right):
+        fr = self._right[i]
+        if fr is None:
+            fr = self._right[i] = scale_surface(self._src[i], self.sizes[i])
+        if facing_right:
+            return fr
+        fl = self._left[i]
+        if fl is None:
+            fl = self._left[i] = pygame.transform.flip(fr, True, False)
+        return fl
+
+    def facing(self, facing_right):
+        return self._views[0 if facing_right else 1]
+
+    def nbytes(self):
+        # upper bound: both facings of every frame once all are built
+        return sum(w * h * 4 * 2 for w, h in self.sizes)
+
+class _FacingView:
+    __slots__ = ("frames", "facing_right")
+    def __init__(self, frames, facing_right):
+        self.frames = frames
+        self.facing_right = facing_right
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, i):
+        return self.frames.frame(i, self.facing_right)
+
+class ScaledFrameCache:
+    """Scaled frame sets keyed by (name, scale), least recently used evicted first.
+
+    A miss returns ScaledFrames, so switching to a new scale costs nothing until
+    each frame is first drawn; going back to a cached scale costs nothing at all.
+    ``budget_bytes`` caps the total, but the most recent set is always kept.
+    """
+    def __init__(self, budget_bytes=64 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.used = 0
+        self._sets = OrderedDict()
+
+    @staticmethod
+    def _key(name, scale):
+        return (name, round(float(scale), 2))
+
+    def put(self, name, scale, anims):
+        """Store an {anim: frames} set (e.g. one loaded from the atlas cache)."""
+        key = self._key(name, scale)
+        self._drop(key)
+        self._sets[key] = anims
+        self.used += sum(frames.nbytes() for frames in anims.values())
+        self._evict()
+
+    def get(self, name, scale, orig):
+        """Frames of ``orig`` ({anim: [Surface]}) at ``scale``, building lazily on a miss."""
+        key = self._key(name, scale)
+        anims = self._sets.get(key)
+        if anims is not None:
+            self._sets.move_to_end(key)
+            return anims
+        anims = {k: ScaledFrames(frames, key[1]) for k, frames in orig.items()}
+        if any(orig.values()):
+            self.put(name, scale, anims)
+        return anims
+
+    def discard(self, name):
+        for key in [k for k in self._sets if k[0] == name]:
+            self._drop(key)
+
+    def _drop(self, key):
+        anims = self._sets.pop(key, None)
+        if anims is not None:
+            self.used -= sum(frames.nbytes() for frames in anims.values())
+
+    def _evict(self):
+        while self.used > self.budget_bytes and len(self._sets) > 1:
+            self._drop(next(iter(self._sets)))
+
+# ================== Collision masks ==================
+MASK_ALPHA_THRESHOLD = 127
+
+def frame_masks(frames):
+    """A (right, left) pygame mask pair per frame, at the frame's own size."""
+    pairs = []
+    for f in frames:
+        pairs.append((pygame.mask.from_surface(f, MASK_ALPHA_THRESHOLD),
+                      pygame.mask.from_surface(pygame.transform.flip(f, True, False), MASK_ALPHA_THRESHOLD)))
+    return pairs
+
+class LazyMasks:
+    """One animation's masks at ``sizes``, each fitted by ``fit(i, size)`` the
+    first time it is looked up, i.e. when a box test for that frame passes."""
+    __slots__ = ("_fit", "_sizes", "_items")
+
+    def __init__(self, fit, sizes):
+        self._fit = fit
+        self._sizes = sizes
+        self._items = [None] * len(sizes)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __getitem__(self, i):
+        item = self._items[i]
+        if item is None:
+            item = self._items[i] = self._fit(i, self._sizes[i])
+        return item
+
+class CollisionMasks:
+    """Pixel-perfect hit masks for every fighter and fireball frame.
+
+    ``add`` builds masks once from the unscaled frames (both facings);
+    ``apply`` hands each fighter and the bullets masks for the hit box sizes
+    they use now. Those are fitted lazily (LazyMasks), so a rescale costs
+    nothing up front and a Mask.scale only for frames that actually touch
+    something; the per-step cost is an overlap test only where boxes already
+    meet. Scaled masks are kept (up to ``max_fitted``) for switching back and forth.
+    """
+    def __init__(self, max_fitted=4096):
+        self.base = {}                 # name -> {anim: [(right, left)]}
+        self.max_fitted = max_fitted
+        self._fitted = OrderedDict()   # (name, anim, i, size) -> (right, left)
+        self._solid = {}               # size -> filled mask
+
+    def add(self, name, anims):
+        """Masks for {anim: [Surface]} at their own size; "fireballs" uses {"fire": frames}."""
+        self.base[name] = {k: frame_masks(frames) for k, frames in anims.items() if frames}
+        for key in [k for k in self._fitted if k[0] == name]:
+            del self._fitted[key]
+
+    def _fit(self, name, anim, i, size):
+        key = (name, anim, i, tuple(size))
+        pair = self._fitted.get(key)
+        if pair is None:
+            right, left = self.base[name][anim][i]
+            if right.get_size() != key[3]:
+                right, left = right.scale(key[3]), left.scale(key[3])
+            pair = self._fitted[key] = (right, left)
+            if len(self._fitted) > self.max_fitted:
+                self._fitted.popitem(last=False)
+        else:
+            self._fitted.move_to_end(key)
+        return pair
+
+    def solid(self, size):
+        mask = self._solid.get(size)
+        if mask is None:
+            mask = self._solid[size] = pygame.mask.Mask(size, fill=True)
+        return mask
+
+    def fighter_masks(self, name, frame_sizes):
+        """{anim: [(right, left, attack)]} for ``frame_sizes``; anims without masks are left out."""
+        base = self.base.get(name, {})
+        out = {}
+        for anim, sizes in frame_sizes.items():
+            if len(base.get(anim, ())) != len(sizes):
+                continue
+            out[anim] = LazyMasks(lambda i, size, anim=anim: self._fit(name, anim, i, size)
+                                  + (self.solid(attack_size(*size)),), [tuple(s) for s in sizes])
+        return out
+
+    def bullet_masks(self, sizes):
+        fire = self.base.get("fireballs", {}).get("fire", ())
+        if sizes is None or len(fire) != len(sizes):
+            return None
+        return LazyMasks(lambda i, size: self._fit("fireballs", "fire", i, size), [tuple(s) for s in sizes.tolist()])
+
+    def apply(self, state):
+        """Give every fighter and the bullets of ``state`` masks for their current sizes."""
+        for f in state.fighters:
+            f.set_frame_masks(self.fighter_masks(f.skin, f.frame_sizes))
+        state.set_bullet_masks(self.bullet_masks(state.bullet_sizes))
+
+# ================== Atlas cache ==================
+# An atlas file is: magic, u32 header length, JSON header, then every frame's
+# raw RGBA pixels back to back. The header lists each animation's frames as
+# [w, h, offset, x0, y0, x1, y1], where the box is the frame's place in the
+# sheet (the whole frame when unknown).
+ATLAS_MAGIC = b"NVSATLS1"
+ATLAS_VERSION = 2
+
+_digests = {}
+
+def file_digest(path):
+    """SHA-1 of a file's contents, memoised on (path, size, mtime)."""
+    st = os.stat(path)
+    memo = (path, st.st_size, st.st_mtime_ns)
+    if memo not in _digests:
+        with open(path, "rb") as f:
+            _digests[memo] = hashlib.sha1(f.read()).hexdigest()
+    return _digests[memo]
+
+def atlas_key(path, cfg, scale):
+    """Cache key for ``path`` sliced with ``cfg`` at ``scale`` (None = original size)."""
+    scale_tag = "orig" if scale is None else f"{float(scale):.4f}"
+    blob = json.dumps([ATLAS_VERSION, file_digest(path), cfg, scale_tag], sort_keys=True)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+def save_atlas(atlas_path, anims, boxes=None):
+    header = {}
+    chunks = []
+    offset = 0
+    for name, frames in anims.items():
+        anim_boxes = (boxes or {}).get(name) or []
+        entries = []
+        for i, f in enumerate(frames):
+            w, h = f.get_size()
+            data = pygame.image.tostring(f, "RGBA")
+            box = list(anim_boxes[i]) if i < len(anim_boxes) else [0, 0, w, h]
+            entries.append([w, h, offset] + box)
+            chunks.append(data)
+            offset += len(data)
+        header[name] = entries
+    hdr = json.dumps(header).encode()
+    os.makedirs(os.path.dirname(atlas_path), exist_ok=True)
+    tmp = atlas_path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(ATLAS_MAGIC + struct.pack("<I", len(hdr)) + hdr)
+        for c in chunks:
+            f.write(c)
+    os.replace(tmp, atlas_path)
+
+def load_atlas(atlas_path, boxes=None, convert=True):
+    """Read an atlas with a single read; returns {anim: [Surface]} or None if
+    unusable (missing, or truncated or corrupt: the caller rebuilds it)."""
+    try:
+        with open(atlas_path, "rb") as f:
+            blob = f.read()
+    except OSError:
+        return None
+    if blob[:8] != ATLAS_MAGIC:
+        return None
+    try:
+        (hlen,) = struct.unpack_from("<I", blob, 8)
+        header = json.loads(blob[12:12 + hlen])
+        pixels = memoryview(blob)[12 + hlen:]
+        anims = {}
+        anim_boxes = {}
+        for name, entries in header.items():
+            frames = []
+            for w, h, off, x0, y0, x1, y1 in entries:
+                if off + w*h*4 > len(pixels):
+                    raise ValueError("pixels cut short")
+                img = pygame.image.frombuffer(pixels[off:off + w*h*4], (w, h), "RGBA")
+                frames.append(img.convert_alpha() if convert else img)
+            anims[name] = frames
+            anim_boxes[name] = [tuple(e[3:]) for e in entries]
+    except (struct.error, ValueError, TypeError, AttributeError, pygame.error) as e:
+        print("Ignoring unreadable atlas cache", os.path.basename(atlas_path), e)
+        return None
+    if boxes is not None:
+        boxes.update(anim_boxes)
+    return anims
+
+def load_sheet_cached(path, cfg, scale=None, orig=None, boxes=None, convert=True):
+    """Sliced (scale=None) or scaled frames of a sheet, via the atlas cache.
+
+    On a miss the frames are sliced with load_sheet_by_cfg (or scaled from
+    ``orig`` when given) and written back. Scaled results come back as
+    FacingFrames, exactly like rescale_animations. ``convert`` only applies
+    to unscaled frames; scaling always converts.
+    """
+    if not os.path.isfile(path):
+        return load_sheet_by_cfg(path, cfg) if scale is None else rescale_animations(orig, scale)
+    atlas_path = os.path.join(ATLAS_DIR, atlas_key(path, cfg, scale) + ".atlas")
+    anims = load_atlas(atlas_path, boxes, convert or scale is not None)
+    if anims is not None:
+        if scale is None:
+            print(f"Loaded {sum(len(v) for v in anims.values())} frames for {os.path.basename(path)} from atlas cache.")
+            return anims
+        return {k: FacingFrames(v) for k, v in anims.items()}
+
+    src_boxes = {}
+    if scale is None:
+        anims = load_sheet_by_cfg(path, cfg, src_boxes, convert)
+    else:
+        if orig is None:
+            orig = load_sheet_cached(path, cfg, None, boxes=src_boxes)
+        anims = rescale_animations(orig, scale)
+    if boxes is not None:
+        boxes.update(src_boxes)
+    if any(anims.values()):
+        try:
+            save_atlas(atlas_path, anims, src_boxes)
+        except OSError as e:
+            print("Failed to write atlas cache", atlas_path, e)
+    return anims
@@ -0,0 +1,144 @@
+"""Match telemetry: what happened in each match, for balancing across cabinets.
+
+The game calls ``record(kind, **fields)``, which only appends to a bounded
+ring buffer (the oldest records are dropped and counted if the writer falls
+behind). A daemon thread drains the buffer every ``flush_s`` to a log in
+``directory``:
+
+- ``jsonl``: one JSON object per line;
+- ``bin``: ``b"NVSTEL1\\n"``, then per flush a u32 length and a
+  zlib-compressed block of those same JSON lines.
+
+A log past ``max_bytes`` is rotated to ``telemetry.1.<ext>`` and so on, up
+to ``keep`` old files. ``python telemetry.py telemetry/*`` sums damage per
+attack kind, KOs and match lengths over any number of logs.
+"""
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+from collections import Counter, deque
+from time import time
+
+TELEMETRY_MAGIC = b"NVSTEL1\n"
+FORMATS = ("jsonl", "bin")
+
+class Telemetry:
+    def __init__(self, directory, fmt="jsonl", capacity=16384, flush_s=0.5,
+                 max_bytes=8 * 1024 * 1024, keep=5):
+        if fmt not in FORMATS:
+            raise ValueError(f"telemetry format must be one of {FORMATS}, not {fmt!r}")
+        self.directory = directory
+        self.fmt = fmt
+        self.path = os.path.join(directory, f"telemetry.{fmt}")
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.flush_s = flush_s
+        self.dropped = 0
+        self.written = 0
+        self._buf = deque(maxlen=capacity)
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, kind, **fields):
+        """Queue one record; never touches the disk."""
+        buf = self._buf
+        if len(buf) == buf.maxlen:
+            self.dropped += 1
+        fields["t"] = round(time(), 3)
+        fields["kind"] = kind
+        buf.append(fields)
+
+    def close(self, timeout=2.0):
+        """Write out what is queued and stop the writer."""
+        self._stop = True
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(self.flush_s)
+            self._wake.clear()
+            self._safe_flush()
+        self._safe_flush()  # whatever was recorded before close()
+
+    def _safe_flush(self):
+        try:
+            self._flush()
+        except OSError as e:
+            print("Telemetry write failed:", e)
+
+    def _flush(self):
+        buf = self._buf
+        records = []
+        while buf:
+            records.append(buf.popleft())
+        if not records:
+            return
+        lines = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records).encode("utf-8")
+        os.makedirs(self.directory, exist_ok=True)
+        self._rotate()
+        fresh = not os.path.exists(self.path)
+        with open(self.path, "ab") as f:
+            if self.fmt == "jsonl":
+                f.write(lines)
+            else:
+                block = zlib.compress(lines)
+                f.write((TELEMETRY_MAGIC if fresh else b"") + struct.pack("<I", len(block)) + block)
+        self.written += len(records)
+
+    def _rotate(self):
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        stem, ext = os.path.splitext(self.path)
+        for i in range(self.keep - 1, 0, -1):
+            older = f"{stem}.{i}{ext}"
+            if os.path.exists(older):
+                os.replace(older, f"{stem}.{i + 1}{ext}")
+        os.replace(self.path, f"{stem}.1{ext}")
+
+def read_log(path):
+    """Every record of a jsonl or bin telemetry log, in order."""
+    with open(path, "rb") as f:
+        blob = f.read()
+    if blob.startswith(TELEMETRY_MAGIC):
+        off, lines = len(TELEMETRY_MAGIC), []
+        while off + 4 <= len(blob):
+            (n,) = struct.unpack_from("<I", blob, off)
+            lines.append(zlib.decompress(blob[off + 4:off + 4 + n]))
+            off += 4 + n
+        blob = b"".join(lines)
+    return [json.loads(line) for line in blob.splitlines() if line.strip()]
+
+def summarize(records):
+    """Damage and hits per attack kind, KOs per winner and match lengths."""
+    damage, hits, wins = Counter(), Counter(), Counter()
+    frames = []
+    for r in records:
+        if r["kind"] == "hit":
+            damage[r["via"]] += r["damage"]
+            hits[r["via"]] += 1
+        elif r["kind"] == "match_end":
+            frames.append(r["frames"])
+            if r.get("winner"):
+                wins[r["winner"]] += 1
+    return {
+        "matches": len(frames),
+        "mean_frames": round(sum(frames) / len(frames), 1) if frames else 0,
+        "hits": dict(hits),
+        "damage": dict(damage),
+        "wins": dict(wins),
+    }
+
+if __name__ == "__main__":
+    records = []
+    for path in sys.argv[1:]:
+        records.extend(read_log(path))
+    print(json.dumps(summarize(records), indent=2))
@@ -0,0 +1,50 @@
+import pygame
+import pytest
+
+import sprites
+from sprites import FacingFrames, ScaledFrames, local_frame
+
+def frames(n, w=4, h=6):
+    return FacingFrames(pygame.Surface((w + i, h)) for i in range(n))
+
+def test_local_frame_wraps_recorded_index():
+    anims = {"idle": frames(2), "walk": frames(3)}
+    # the recording machine's walk had 6 frames
+    assert local_frame(anims, "walk", 5, True) is anims["walk"][2]
+    assert local_frame(anims, "walk", 4, False) is anims["walk"].left[1]
+
+def test_local_frame_falls_back_to_local_animation():
+    anims = {"idle": frames(2), "jump": FacingFrames()}
+    assert local_frame(anims, "jump", 3, True, ["idle", "walk"]) is anims["idle"][1]
+    assert local_frame(anims, "dash", 0, True, ["idle"]) is anims["idle"][0]
+    assert local_frame(anims, "dash", 0, True) is None
+    assert local_frame({}, "idle", 0, True, ["idle"]) is None
+
+def test_local_frame_scaled_frames():
+    scaled = ScaledFrames(frames(2), 2.0)
+    assert local_frame({"idle": scaled}, "idle", 3, True).get_size() == (10, 12)
+
+def make_sheet(tmp_path):
+    sheet = pygame.Surface((8, 6), pygame.SRCALPHA)
+    sheet.fill((200, 40, 40, 255), (0, 0, 4, 6))
+    sheet.fill((40, 200, 40, 255), (4, 0, 4, 6))
+    path = str(tmp_path / "sheet.png")
+    pygame.image.save(sheet, path)
+    return path
+
+@pytest.mark.parametrize("keep", [5, 11, 20, -1])
+def test_truncated_atlas_is_rebuilt(tmp_path, monkeypatch, keep):
+    monkeypatch.setattr(sprites, "ATLAS_DIR", str(tmp_path / "atlas"))
+    path = make_sheet(tmp_path)
+    cfg = {"mode": "grid", "cols": 2, "rows": 1}
+    first = sprites.load_sheet_cached(path, cfg)
+    (atlas,) = (tmp_path / "atlas").iterdir()
+    whole = atlas.read_bytes()
+    atlas.write_bytes(whole[:keep])
+
+    assert sprites.load_atlas(str(atlas)) is None
+    boxes = {}
+    again = sprites.load_sheet_cached(path, cfg, boxes=boxes)
+    assert [f.get_size() for f in again["idle"]] == [f.get_size() for f in first["idle"]]
+    assert boxes["idle"] == [(0, 0, 4, 6), (4, 0, 8, 6)]
+    assert atlas.read_bytes() == whole
@@ -0,0 +1,150 @@
+"""Headless bot tournaments over every core, for balance passes.
+
+    python tournament.py --matches 2000 --bots rush,zoner,random --out leaderboard.json
+
+Every ordered pair of bots (Naruto's bot, Sasuke's bot) plays the same
+number of matches on each map, spread over a multiprocessing pool; each
+match runs the plain simulation with nothing drawn. The merged leaderboard
+has, per fighter (skin played by a bot), overall and per map: matches,
+wins, draws, win rate, mean match length and damage dealt and taken by
+attack kind. Matches past ``--max-frames`` are draws.
+
+Maps don't change the simulation yet; they are kept apart so map-specific
+rules show up in the numbers once they exist. ``--sizes`` takes hit box
+sizes from a replay recorded by the game, so results match the real
+sprites instead of the 50x80 fallback boxes.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+from collections import defaultdict
+from multiprocessing import Pool
+from time import perf_counter
+
+from bots import BOTS
+from simulation import new_match, step
+
+MAPS = ["Forest", "Village", "Arena"]
+SIM_HZ = 60
+
+def replay_sizes(path):
+    """(frame sizes by skin, bullet sizes) recorded at the start of a replay."""
+    from replay import load_replay
+    entry = load_replay(path).resize_at(0)
+    frame_sizes = {name: {k: [tuple(s) for s in v] for k, v in anims.items()}
+                   for name, anims in entry["fighters"].items()}
+    return frame_sizes, entry["bullets"]
+
+def play_match(job):
+    """One match; returns its summary dict (runs in a pool worker)."""
+    seed, bots, map_name, max_frames, sizes = job
+    frame_sizes, bullet_sizes = sizes
+    rng = random.Random(seed)
+    state = new_match(frame_sizes, bullet_sizes)
+    players = [BOTS[b](i, random.Random(rng.random())) for i, b in enumerate(bots)]
+    names = [f.name for f in state.fighters]
+    dealt = {n: defaultdict(int) for n in names}
+    taken = {n: defaultdict(int) for n in names}
+    while not state.game_over and state.frame < max_frames:
+        step(state, [p.act(state) for p in players])
+        for ev in state.events:
+            if ev[0] == "hit":
+                dealt[ev[1]][ev[4]] += ev[3]
+                taken[ev[2]][ev[4]] += ev[3]
+    return {
+        "seed": seed,
+        "map": map_name,
+        "frames": state.frame,
+        "winner": state.winner if state.game_over else None,
+        "fighters": [{"name": n, "bot": b, "dealt": dict(dealt[n]), "taken": dict(taken[n])}
+                     for n, b in zip(names, bots)],
+    }
+
+def schedule(matches, bots, maps, max_frames, sizes, seed=0):
+    """Jobs cycling through every ordered bot pairing and map."""
+    pairs = list(itertools.product(bots, repeat=2))
+    return [(seed + k, pairs[k % len(pairs)], maps[(k // len(pairs)) % len(maps)], max_frames, sizes)
+            for k in range(matches)]
+
+def _new_entry():
+    return {"matches": 0, "wins": 0, "draws": 0, "frames": 0,
+            "dealt": defaultdict(int), "taken": defaultdict(int)}
+
+def aggregate(results):
+    """Merged leaderboard: {"<skin> (<bot>)": totals, with a "maps" breakdown}, best win rate first."""
+    table = defaultdict(lambda: dict(_new_entry(), maps=defaultdict(_new_entry)))
+    for r in results:
+        for f in r["fighters"]:
+            key = f"{f['name']} ({f['bot']})"
+            for entry in (table[key], table[key]["maps"][r["map"]]):
+                entry["matches"] += 1
+                entry["frames"] += r["frames"]
+                entry["wins"] += r["winner"] == f["name"]
+                entry["draws"] += r["winner"] is None
+                for via, dmg in f["dealt"].items():
+                    entry["dealt"][via] += dmg
+                for via, dmg in f["taken"].items():
+                    entry["taken"][via] += dmg
+
+    def finish(entry):
+        n = max(1, entry["matches"])
+        return {"matches": entry["matches"], "wins": entry["wins"], "draws": entry["draws"],
+                "win_rate": round(entry["wins"] / n, 4),
+                "mean_seconds": round(entry["frames"] / n / SIM_HZ, 2),
+                "dealt": dict(entry["dealt"]), "taken": dict(entry["taken"])}
+
+    board = {}
+    for key, entry in table.items():
+        board[key] = finish(entry)
+        board[key]["maps"] = {m: finish(e) for m, e in sorted(entry["maps"].items())}
+    return dict(sorted(board.items(), key=lambda kv: kv[1]["win_rate"], reverse=True))
+
+def run(jobs, workers=None):
+    """Play ``jobs`` on ``workers`` processes (default: every core); returns the results."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [play_match(j) for j in jobs]
+    with Pool(workers) as pool:
+        results = list(pool.imap_unordered(play_match, jobs, chunksize=max(1, len(jobs) // (workers * 8))))
+    return sorted(results, key=lambda r: r["seed"])
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Headless bot tournament")
+    ap.add_argument("--matches", type=int, default=600)
+    ap.add_argument("--bots", default="rush,zoner,random", help=f"comma-separated, from {sorted(BOTS)}")
+    ap.add_argument("--maps", default=",".join(MAPS))
+    ap.add_argument("--workers", type=int, default=0, help="processes (0 = every core)")
+    ap.add_argument("--max-frames", type=int, default=99 * SIM_HZ)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--sizes", help="replay file to take hit box sizes from")
+    ap.add_argument("--out", help="write the leaderboard JSON here")
+    args = ap.parse_args(argv)
+
+    bots = args.bots.split(",")
+    unknown = [b for b in bots if b not in BOTS]
+    if unknown:
+        ap.error(f"unknown bots {unknown}; choose from {sorted(BOTS)}")
+    sizes = replay_sizes(args.sizes) if args.sizes else (None, None)
+    jobs = schedule(args.matches, bots, args.maps.split(","), args.max_frames, sizes, args.seed)
+
+    t0 = perf_counter()
+    results = run(jobs, args.workers)
+    secs = perf_counter() - t0
+    board = aggregate(results)
+
+    frames = sum(r["frames"] for r in results)
+    print(f"{len(results)} matches ({frames} frames) in {secs:.1f}s, {frames / secs:.0f} frames/s", file=sys.stderr)
+    for key, e in board.items():
+        print(f"{key:<20} win {e['win_rate']:6.1%}  draws {e['draws']:4}  {e['mean_seconds']:5.1f}s/match  "
+              f"dealt {e['dealt']}  taken {e['taken']}", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"matches": len(results), "bots": bots, "leaderboard": board}, fh, indent=2)
+            fh.write("\n")
+        print("Wrote", args.out, file=sys.stderr)
+
+if __name__ == "__main__":
+    main()